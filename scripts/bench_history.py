@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the per-step cost of building the request history.
+
+Compares FaraAgent.maybe_remove_old_screenshots, which rebuilds the list from the whole
+history every step, with WindowedHistory, which updates its view when a turn is appended.
+No browser or model is needed.
+"""
+
+import argparse
+import time
+
+from PIL import Image
+
+from fara import FaraAgent
+from fara.fara_types import AssistantMessage, ImageObj, UserMessage
+from fara.history import WindowedHistory
+
+
+def _turn(step: int):
+    # the images are tiny, only the history bookkeeping is measured
+    screenshot = ImageObj.from_pil(Image.new("RGB", (8, 8)))
+    user = UserMessage(content=[screenshot, f"Current URL: https://example.com/{step}"])
+    return user, AssistantMessage(content=f"thoughts {step}")
+
+
+def bench_rebuild(rounds: int, max_n_images: int):
+    agent = FaraAgent(browser_manager=None, client_config={}, max_n_images=max_n_images)
+    history = [UserMessage(content=[ImageObj.from_pil(Image.new("RGB", (8, 8))), "task"], is_original=True)]
+    timings = []
+    for step in range(rounds):
+        user, assistant = _turn(step)
+        start = time.perf_counter()
+        request = agent.maybe_remove_old_screenshots(history)
+        request.append(user)
+        timings.append(time.perf_counter() - start)
+        history.append(user)
+        history.append(assistant)
+    return timings
+
+
+def bench_windowed(rounds: int, max_n_images: int):
+    history = WindowedHistory(max_n_images)
+    history.append(UserMessage(content=[ImageObj.from_pil(Image.new("RGB", (8, 8))), "task"], is_original=True))
+    timings = []
+    for step in range(rounds):
+        user, assistant = _turn(step)
+        start = time.perf_counter()
+        history.append(user)
+        history.view()
+        timings.append(time.perf_counter() - start)
+        history.append(assistant)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark request history construction")
+    parser.add_argument("--rounds", type=int, default=400, help="Number of steps (default: 400)")
+    parser.add_argument("--max_n_images", type=int, default=3, help="Image window (default: 3)")
+    parser.add_argument("--buckets", type=int, default=4, help="Number of step ranges to report (default: 4)")
+    args = parser.parse_args()
+
+    results = {
+        "maybe_remove_old_screenshots": bench_rebuild(args.rounds, args.max_n_images),
+        "WindowedHistory": bench_windowed(args.rounds, args.max_n_images),
+    }
+    size = max(1, args.rounds // args.buckets)
+    print(f"Mean per-step cost in microseconds, max_n_images={args.max_n_images}")
+    header = "".join(f"{f'steps {i}-{min(i + size, args.rounds) - 1}':>16}" for i in range(0, args.rounds, size))
+    print(f"{'':30}{header}")
+    for name, timings in results.items():
+        row = "".join(
+            f"{sum(chunk) / len(chunk) * 1e6:>16.1f}"
+            for chunk in (timings[i : i + size] for i in range(0, args.rounds, size))
+        )
+        print(f"{name:30}{row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import copy
 import math
 
-from typing import Union, Tuple
+from functools import lru_cache
+from typing import NamedTuple, Union, Tuple
 
+from .fara_types import SystemMessage
 from .qwen_helpers.base_tool import BaseTool
 from .qwen_helpers.fncall_prompt import NousFnCallPrompt
 from .qwen_helpers.schema import (
@@ -14,6 +17,21 @@ MIN_PIXELS = 4 * 28 * 28
 MAX_PIXELS = 16384 * 28 * 28
 MAX_RATIO = 200
 
+# Qwen2.5-VL image processor settings used by FaraAgent
+DEFAULT_PROCESSOR_IM_CFG = {
+    "min_pixels": 3136,
+    "max_pixels": 12845056,
+    "patch_size": 14,
+    "merge_size": 2,
+}
+
+
+class _ImageSize(NamedTuple):
+    """Stand-in for an image when only its dimensions are needed."""
+
+    width: int
+    height: int
+
 
 # @register_tool("computer_use")
 class FaraComputerUse(BaseTool):
@@ -121,6 +139,8 @@ The action to perform. The available actions are:
         self.display_width_px = cfg["display_width_px"]
         self.display_height_px = cfg["display_height_px"]
         include_input_text_key_args = cfg.pop("include_input_text_key_args", False)
+        # copy so that popping optional args does not leak into the class attribute
+        self.parameters = copy.deepcopy(self.parameters)
         if not include_input_text_key_args:
             self.parameters["properties"].pop("press_enter", None)
             self.parameters["properties"].pop("delete_existing_text", None)
@@ -230,6 +250,25 @@ def smart_resize(
     return h_bar, w_bar
 
 
+def aligned_viewport_size(
+    width: int, height: int, processor_im_cfg=DEFAULT_PROCESSOR_IM_CFG
+) -> Tuple[int, int]:
+    """Closest viewport size whose screenshots need no resizing for the model.
+
+    Returns:
+        (width, height) such that `smart_resize` leaves a capture of that size unchanged.
+    """
+    factor = processor_im_cfg["patch_size"] * processor_im_cfg["merge_size"]
+    aligned_height, aligned_width = smart_resize(
+        height,
+        width,
+        factor=factor,
+        min_pixels=processor_im_cfg["min_pixels"],
+        max_pixels=processor_im_cfg["max_pixels"],
+    )
+    return aligned_width, aligned_height
+
+
 def get_computer_use_system_prompt(
     image,
     processor_im_cfg,
@@ -274,3 +313,48 @@ def get_computer_use_system_prompt(
         "conversation": [msg.model_dump() for msg in conversation],
         "im_size": (resized_width, resized_height),
     }
+
+
+@lru_cache(maxsize=64)
+def _compile_system_prompt(
+    height: int,
+    width: int,
+    processor_im_cfg_items: Tuple[Tuple[str, int], ...],
+    include_input_text_key_args: bool,
+    fn_call_template: str,
+) -> Tuple[Tuple[SystemMessage, ...], Tuple[int, int]]:
+    prompt_info = get_computer_use_system_prompt(
+        _ImageSize(width=width, height=height),
+        dict(processor_im_cfg_items),
+        include_input_text_key_args=include_input_text_key_args,
+        fn_call_template=fn_call_template,
+    )
+    system_messages = tuple(
+        SystemMessage(content="".join(c["text"] for c in msg["content"]))
+        for msg in prompt_info["conversation"]
+    )
+    return system_messages, prompt_info["im_size"]
+
+
+def get_compiled_system_prompt(
+    image,
+    processor_im_cfg,
+    include_input_text_key_args=False,
+    fn_call_template="default",
+) -> Tuple[Tuple[SystemMessage, ...], Tuple[int, int]]:
+    """Cached version of `get_computer_use_system_prompt`.
+
+    The prompt only depends on the screenshot resolution, the processor config and
+    the template options, so the compiled `SystemMessage`s are shared by every agent
+    in the process. The returned messages must not be mutated.
+
+    Returns:
+        (system_messages, (resized_width, resized_height))
+    """
+    return _compile_system_prompt(
+        image.height,
+        image.width,
+        tuple(sorted(processor_im_cfg.items())),
+        include_input_text_key_args,
+        fn_call_template,
+    )
@@ -1,5 +1,6 @@
 import asyncio
 import atexit
+import functools
 import logging
 import os
 import signal
@@ -17,11 +18,45 @@ from playwright.async_api import (
     async_playwright,
 )
 
+from .._prompts import aligned_viewport_size
+from .browser_pool import (
+    DEFAULT_USER_AGENT,
+    BrowserPool,
+    PreparedContext,
+    WarmContextQueue,
+    read_page_script,
+)
+from .http_cache import HttpCache, HttpCacheStats
+from .interception import (
+    InterceptionProfile,
+    InterceptionStats,
+    RequestInterceptor,
+    get_interception_profile,
+)
 from .playwright_controller import PlaywrightController
 
 
 class BrowserBB:
-    """Manages browser instance, context, and page lifecycle."""
+    """Manages browser instance, context, and page lifecycle.
+
+    With a `browser_pool`, the browser is leased from the pool and only a new
+    context is created per task; `close()` returns the browser to the pool. With
+    `warm_contexts`, the context and page are taken already prepared from the queue,
+    falling back to a new context if none is ready within `WARM_CONTEXT_TIMEOUT`
+    seconds. Neither is used with BrowserBase or a persistent `browser_data_dir`.
+
+    `record_har_path` records the network traffic of the context to a HAR file
+    (written on `close()`, with attached content if the path ends in .zip), and
+    `replay_har_path` serves every request from such a file, aborting the requests
+    it does not contain, so that a task can be rerun without network. Warm contexts
+    are not used with either, since they load their start page before the task.
+
+    `http_cache` (an HttpCache or its directory) serves static assets from a disk
+    cache shared across contexts and processes; it is not used with replay.
+    """
+
+    USER_AGENT = DEFAULT_USER_AGENT
+    WARM_CONTEXT_TIMEOUT = 30
 
     def __init__(
         self,
@@ -35,7 +70,15 @@ class BrowserBB:
         to_resize_viewport: bool = True,
         single_tab_mode: bool = True,
         animate_actions: bool = False,
+        popup_grace_period: float = 0.25,
         use_browser_base: bool = False,
+        align_viewport_to_model_grid: bool = False,
+        browser_pool: BrowserPool | None = None,
+        warm_contexts: WarmContextQueue | None = None,
+        request_interception: InterceptionProfile | str | None = None,
+        record_har_path: str | None = None,
+        replay_har_path: str | None = None,
+        http_cache: HttpCache | str | None = None,
         logger: Optional[logging.Logger] = None,
     ):
         self.headless = headless
@@ -45,9 +88,48 @@ class BrowserBB:
         self.downloads_folder = downloads_folder
         self.to_resize_viewport = to_resize_viewport
         self.animate_actions = animate_actions
+        # seconds a click waits for a popup it may have opened, see PlaywrightController
+        self.popup_grace_period = popup_grace_period
         self.single_tab_mode = single_tab_mode
         self.use_browser_base = use_browser_base
+        self.warm_contexts = warm_contexts
+        if warm_contexts is not None:
+            browser_pool = warm_contexts.pool
+        self.browser_pool = browser_pool
+        # whether self.browser was leased from browser_pool
+        self._leased_browser = False
         self.logger = logger or logging.getLogger("browser_manager")
+        # aborts ad, tracker and heavy requests of the context, off by default
+        if isinstance(request_interception, str):
+            request_interception = get_interception_profile(request_interception)
+        self._interceptor = (
+            RequestInterceptor(request_interception, logger=self.logger)
+            if request_interception is not None
+            else None
+        )
+        if record_har_path is not None and replay_har_path is not None:
+            raise ValueError(
+                "Error: Browser_manager.Browser: record_har_path and replay_har_path are mutually exclusive"
+            )
+        if record_har_path is not None and use_browser_base:
+            raise ValueError(
+                "Error: Browser_manager.Browser: record_har_path is not supported with BrowserBase"
+            )
+        if replay_har_path is not None and not os.path.exists(replay_har_path):
+            raise FileNotFoundError(
+                f"Error: Browser_manager.Browser: replay_har_path does not exist: {replay_har_path}"
+            )
+        self.record_har_path = record_har_path
+        self.replay_har_path = replay_har_path
+        if isinstance(http_cache, str):
+            http_cache = HttpCache(http_cache, logger=self.logger)
+        if http_cache is not None and replay_har_path is not None:
+            raise ValueError(
+                "Error: Browser_manager.Browser: http_cache cannot be used with replay_har_path"
+            )
+        self.http_cache = http_cache
+        # requests of this browser's context served by http_cache
+        self._http_cache_stats = HttpCacheStats()
         self.is_linux = platform.system() == "Linux"
         self._viewport_height = viewport_height
         self._viewport_width = viewport_width
@@ -61,6 +143,14 @@ class BrowserBB:
             raise ValueError(
                 f"Error: Browser_manager.Browser:Invalid viewport height: {self._viewport_height}. Must be a positive integer."
             )
+        if align_viewport_to_model_grid:
+            # screenshots then already have the model's input size and are sent without resizing
+            self._viewport_width, self._viewport_height = aligned_viewport_size(
+                self._viewport_width, self._viewport_height
+            )
+            self.logger.info(
+                f"Aligned viewport to model grid: {viewport_width}x{viewport_height} -> {self._viewport_width}x{self._viewport_height}"
+            )
         assert isinstance(
             self.headless, bool
         ), f"Error: Browser_manager.Browser: headless must be a boolean, got {type(self.headless)}"
@@ -80,6 +170,14 @@ class BrowserBB:
             isinstance(self.browser_channel, str)
             and (self.browser_channel in ["chromium", "firefox", "webkit"])
         ), f"Error: Browser_manager.Browser: browser_channel must be one of ['chromium', 'firefox', 'webkit'], got {self.browser_channel}"
+        if warm_contexts is not None and (
+            warm_contexts.viewport_width,
+            warm_contexts.viewport_height,
+        ) != (self._viewport_width, self._viewport_height):
+            raise ValueError(
+                f"Error: Browser_manager.Browser: warm_contexts viewport {warm_contexts.viewport_width}x{warm_contexts.viewport_height} "
+                f"does not match {self._viewport_width}x{self._viewport_height}"
+            )
 
         # Browser-related instances
         self._playwright: Playwright | None = None
@@ -102,6 +200,7 @@ class BrowserBB:
             _download_handler=self._download_handler,
             to_resize_viewport=self.to_resize_viewport,
             single_tab_mode=self.single_tab_mode,
+            popup_grace_period=self.popup_grace_period,
             logger=self.logger,
         )
 
@@ -120,18 +219,36 @@ class BrowserBB:
         shared_data_point=None,  # For captcha tracking
     ) -> None:
         """Initialize the browser, context, and page."""
-        self._playwright = await async_playwright().start()
         self.shared_data_point = shared_data_point
 
+        use_pool = (
+            self.browser_pool is not None
+            and not self.use_browser_base
+            and self.browser_data_dir is None
+        )
+        if not use_pool:
+            # a pooled browser runs on the pool's Playwright driver
+            self._playwright = await async_playwright().start()
+
+        prepared = None
         if self.use_browser_base:
             await self._init_browser_base(self.shared_data_point)
+        elif (
+            use_pool
+            and self.warm_contexts is not None
+            and self.record_har_path is None
+            and self.replay_har_path is None
+        ):
+            prepared = await self._init_warm_context()
+        elif use_pool:
+            await self._init_pooled_browser()
         elif self.browser_data_dir is None:
             await self._init_regular_browser(channel=self.browser_channel)
         else:
             await self._init_persistent_browser()
 
         # Common setup for all browser types
-        await self._setup_common_browser_features(start_page)
+        await self._setup_common_browser_features(start_page, prepared)
 
     async def _init_browser_base(self, shared_data_point) -> None:
         """Initialize BrowserBase connection, defaults to chromium."""
@@ -211,28 +328,87 @@ class BrowserBB:
                 f"Unsupported browser channel: {channel}. Supported channels are 'chromium', 'firefox', and 'webkit'."
             )
 
-        self._context = await self.browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0"
-        )
+        self._context = await self.browser.new_context(**self._context_options())
 
         self._page = await self._context.new_page()
 
+    def _context_options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {"user_agent": self.USER_AGENT}
+        if self.record_har_path is not None:
+            options["record_har_path"] = self.record_har_path
+        return options
+
+    async def _init_pooled_browser(self) -> None:
+        """Create a fresh context on a browser leased from the pool."""
+        self.browser, self._context = await self.browser_pool.new_context(
+            **self._context_options()
+        )
+        self._leased_browser = True
+        self._page = await self._context.new_page()
+
+    async def _init_warm_context(self) -> PreparedContext | None:
+        """Take a prepared context and page from the warm queue, or create a context
+        on a pooled browser if none is ready in time (returns None then)."""
+        try:
+            prepared = await self.warm_contexts.get(timeout=self.WARM_CONTEXT_TIMEOUT)
+        except (asyncio.TimeoutError, RuntimeError) as e:
+            self.logger.warning(f"No warm context ({e}), creating one for this task")
+            await self._init_pooled_browser()
+            return None
+        self.browser, self._context, self._page = (
+            prepared.browser,
+            prepared.context,
+            prepared.page,
+        )
+        self._leased_browser = True
+        return prepared
+
     async def _init_persistent_browser(self) -> None:
         """Initialize persistent browser with data directory."""
         if not self.headless and self.is_linux:
             self.start_xvfb()
 
         launch_args: Dict[str, Any] = {"headless": self.headless}
+        if self.record_har_path is not None:
+            launch_args["record_har_path"] = self.record_har_path
         self._context = await self._playwright.chromium.launch_persistent_context(
             self.browser_data_dir, **launch_args
         )
         self._page = await self._context.new_page()
 
-    async def _setup_common_browser_features(self, start_page: str) -> None:
-        """Set up features common to all browser types."""
-        self._context.set_default_timeout(60000)  # One minute
-        await self._playwright_controller.on_new_page(self._page)
+    async def _setup_common_browser_features(
+        self, start_page: str, prepared: PreparedContext | None = None
+    ) -> None:
+        """Set up features common to all browser types. The timeout, viewport and
+        init script of a `prepared` context are already set."""
         assert self._page is not None
+        if prepared is not None and prepared.interceptor is not None:
+            # installed by the queue for the start page, registered again below so
+            # that it still runs before the other handlers; with the same profile its
+            # stats include the start page load
+            await self._context.unroute("**/*", prepared.interceptor.handle)
+            if (
+                self._interceptor is not None
+                and self._interceptor.profile == prepared.interceptor.profile
+            ):
+                self._interceptor = prepared.interceptor
+        # handlers registered last run first: blocked requests never reach the HAR
+        if self.replay_har_path is not None:
+            await self._context.route_from_har(self.replay_har_path, not_found="abort")
+        if self.http_cache is not None:
+            await self._context.route(
+                "**/*",
+                functools.partial(self.http_cache.handle, stats=self._http_cache_stats),
+            )
+        if self._interceptor is not None:
+            await self._context.route("**/*", self._interceptor.handle)
+        if prepared is None:
+            self._context.set_default_timeout(60000)  # One minute
+            await self._playwright_controller.on_new_page(self._page)
+        else:
+            self._playwright_controller.adopt_page(
+                self._page, loaded=prepared.start_page == start_page
+            )
 
         # Set up new page handling for single tab mode
         if self.single_tab_mode:
@@ -244,16 +420,20 @@ class BrowserBB:
         if self._download_handler:
             self._page.on("download", self._download_handler)
 
-        # Set viewport and add init script
-        await self._page.set_viewport_size(
-            {"width": self._viewport_width, "height": self._viewport_height}
-        )
+        if prepared is None:
+            # Set viewport and add init script
+            await self._page.set_viewport_size(
+                {"width": self._viewport_width, "height": self._viewport_height}
+            )
 
-        await self._page.add_init_script(path=self.page_script_path)
+            await self._page.add_init_script(
+                script=read_page_script(self.page_script_path)
+            )
 
         # Navigate to start page
-        await self._page.goto(start_page)
-        await self._page.wait_for_load_state()
+        if prepared is None or prepared.start_page != start_page:
+            await self._page.goto(start_page)
+            await self._page.wait_for_load_state()
 
     async def _handle_new_page_safe(self, new_pg: Page, main_page: Page) -> None:
         """Safely handle new pages in single tab mode."""
@@ -312,15 +492,32 @@ class BrowserBB:
         """Get the browser context."""
         return self._context
 
+    @property
+    def interception_stats(self) -> InterceptionStats | None:
+        """Requests blocked by `request_interception`, None if it is off."""
+        return self._interceptor.stats if self._interceptor is not None else None
+
+    @property
+    def http_cache_stats(self) -> HttpCacheStats | None:
+        """Requests of this context served by `http_cache`, None if it is off."""
+        return self._http_cache_stats if self.http_cache is not None else None
+
+    @property
+    def viewport_width(self) -> int:
+        """Get the viewport width."""
+        return self._viewport_width
+
+    @property
+    def viewport_height(self) -> int:
+        """Get the viewport height."""
+        return self._viewport_height
+
     @property
     def playwright_controller(self):
         """Get the playwright controller."""
         return self._playwright_controller
 
-    async def close(self) -> None:
-        """Close the browser and clean up resources."""
-        self.logger.info("Closing browser...")
-
+    async def _close_context(self) -> None:
         if self._page is not None:
             await self._page.close()
             self._page = None
@@ -329,6 +526,29 @@ class BrowserBB:
             await self._context.close()
             self._context = None
 
+    async def close(self) -> None:
+        """Close the browser and clean up resources."""
+        self.logger.info("Closing browser...")
+        if self._interceptor is not None:
+            self.logger.info(f"Request interception: {self._interceptor.stats}")
+        if self.http_cache is not None:
+            stats = self._http_cache_stats
+            self.logger.info(
+                f"HTTP cache: {stats.hit_ratio:.0%} hit ratio, {stats.bytes_saved} bytes saved ({stats})"
+            )
+
+        if self._leased_browser:
+            try:
+                await self._close_context()
+            finally:
+                # the browser stays alive for the next task, even if the context crashed
+                self.browser_pool.release(self.browser)
+                self.browser = None
+                self._leased_browser = False
+            return
+
+        await self._close_context()
+
         if self._playwright is not None:
             await self._playwright.stop()
             self._playwright = None
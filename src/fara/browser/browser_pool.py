@@ -0,0 +1,370 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    async_playwright,
+)
+
+from .interception import (
+    InterceptionProfile,
+    RequestInterceptor,
+    get_interception_profile,
+)
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0"
+DEFAULT_PAGE_SCRIPT_PATH = os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), "page_script.js"
+)
+
+
+@lru_cache(maxsize=4)
+def read_page_script(path: str) -> str:
+    """Source of the init script, read from disk once per path."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@dataclass
+class BrowserPoolStats:
+    """Browser launches and context creations of a BrowserPool"""
+
+    launches: int = 0
+    # leases of an already running browser
+    reuses: int = 0
+    # browsers found disconnected when leased and launched again
+    relaunches: int = 0
+    contexts: int = 0
+    context_seconds: float = 0.0
+
+    @property
+    def mean_context_seconds(self) -> float:
+        return self.context_seconds / self.contexts if self.contexts else 0.0
+
+
+class BrowserPool:
+    """Keeps `size` browsers and their Playwright driver alive across tasks.
+
+    A task leases a browser with `new_context()` and gets a fresh, isolated
+    BrowserContext on it, so that only the context (cookies, storage, cache) is
+    created per task instead of the driver and the browser process. The browser
+    returns to the pool with `release()`. A browser that crashed is launched again
+    on its next lease.
+
+    The pool must be used from a single event loop. Browsers are launched on
+    demand; headful browsers need a display, the pool does not start Xvfb.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        browser_channel: str = "firefox",
+        headless: bool = True,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if size < 1:
+            raise ValueError(f"BrowserPool size must be at least 1, got {size}")
+        assert (
+            browser_channel
+            in [
+                "chromium",
+                "firefox",
+                "webkit",
+            ]
+        ), f"Error: BrowserPool: browser_channel must be one of ['chromium', 'firefox', 'webkit'], got {browser_channel}"
+        self.size = size
+        self.browser_channel = browser_channel
+        self.headless = headless
+        self.logger = logger or logging.getLogger("browser_pool")
+        self.stats = BrowserPoolStats()
+        self._playwright: Playwright | None = None
+        self._browsers: List[Browser] = []
+        # browsers running or being launched
+        self._n_slots = 0
+        self._idle: asyncio.Queue[Browser] = asyncio.Queue()
+        self._driver_lock = asyncio.Lock()
+
+    async def _launch(self) -> Browser:
+        async with self._driver_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+        browser_type = getattr(self._playwright, self.browser_channel)
+        browser = await browser_type.launch(headless=self.headless)
+        self.stats.launches += 1
+        self.logger.info(
+            f"Launched pooled {self.browser_channel} browser ({self.stats.launches} launches)"
+        )
+        return browser
+
+    async def acquire(self) -> Browser:
+        """Lease a browser, launching one if fewer than `size` are running."""
+        if self._idle.empty() and self._n_slots < self.size:
+            # take the slot before launching, concurrent leases must not overshoot
+            self._n_slots += 1
+            try:
+                browser = await self._launch()
+            except Exception:
+                self._n_slots -= 1
+                raise
+            self._browsers.append(browser)
+            return browser
+        browser = await self._idle.get()
+        if not browser.is_connected():
+            self.logger.warning("Pooled browser disconnected, launching a new one")
+            self._browsers.remove(browser)
+            try:
+                browser = await self._launch()
+            except Exception:
+                self._n_slots -= 1
+                raise
+            self._browsers.append(browser)
+            self.stats.relaunches += 1
+        else:
+            self.stats.reuses += 1
+        return browser
+
+    def release(self, browser: Browser) -> None:
+        """Return a leased browser to the pool."""
+        if browser in self._browsers:
+            self._idle.put_nowait(browser)
+
+    async def new_context(self, **kwargs: Any) -> Tuple[Browser, BrowserContext]:
+        """Lease a browser and create a fresh context on it.
+
+        Returns:
+            (browser to release once the context is closed, context)
+        """
+        browser = await self.acquire()
+        start = time.perf_counter()
+        try:
+            context = await browser.new_context(**kwargs)
+        except Exception:
+            self.release(browser)
+            raise
+        self.stats.contexts += 1
+        self.stats.context_seconds += time.perf_counter() - start
+        return browser, context
+
+    async def close(self) -> None:
+        """Close every browser and stop the Playwright driver."""
+        self.logger.info(f"Closing browser pool: {self.stats}")
+        for browser in self._browsers:
+            try:
+                await browser.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing pooled browser: {e}")
+        self._browsers = []
+        self._n_slots = 0
+        self._idle = asyncio.Queue()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+@dataclass
+class PreparedContext:
+    """A context and page ready for a task: default timeout, viewport and init script
+    applied, and loaded at `start_page` if it is set. `interceptor` is the route
+    handler installed on the context, if any, with the requests of that load."""
+
+    browser: Browser
+    context: BrowserContext
+    page: Page
+    start_page: str | None
+    prepare_seconds: float
+    interceptor: RequestInterceptor | None = None
+
+
+@dataclass
+class WarmContextStats:
+    """Contexts prepared in the background and handed out by a WarmContextQueue"""
+
+    prepared: int = 0
+    prepare_seconds: float = 0.0
+    # contexts taken without waiting, and taken after waiting for the producer
+    hits: int = 0
+    misses: int = 0
+    wait_seconds: float = 0.0
+    # prepared contexts found closed when taken, or that failed to prepare
+    discarded: int = 0
+    failures: int = 0
+    # `get()` calls that gave up waiting, or saw the producer give up
+    timeouts: int = 0
+    errors: int = 0
+
+    @property
+    def mean_prepare_seconds(self) -> float:
+        return self.prepare_seconds / self.prepared if self.prepared else 0.0
+
+
+class WarmContextQueue:
+    """Keeps up to `depth` prepared contexts ready, off the task's critical path.
+
+    A background producer leases browsers from `pool`, so the pool needs `depth`
+    browsers on top of the ones used by running tasks. Each context gets the
+    default timeout, the viewport and the init script (read once), and is
+    navigated to `start_page` if it is set, so that `get()` returns a page
+    that can be observed right away. With `request_interception`, the profile is
+    applied before that navigation, so the start page loads like it would in a
+    context created for the task. After `MAX_FAILURES` preparations fail in a
+    row the producer stops and waiting `get()` calls raise; the next `get()`
+    starts it again.
+    """
+
+    DEFAULT_TIMEOUT = 60000  # One minute
+    RETRY_SECONDS = 1.0
+    MAX_FAILURES = 3
+
+    def __init__(
+        self,
+        pool: BrowserPool,
+        viewport_width: int,
+        viewport_height: int,
+        depth: int = 1,
+        start_page: str | None = None,
+        page_script_path: str | None = None,
+        user_agent: str = DEFAULT_USER_AGENT,
+        request_interception: InterceptionProfile | str | None = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if depth < 1:
+            raise ValueError(f"WarmContextQueue depth must be at least 1, got {depth}")
+        self.pool = pool
+        self.viewport_width = viewport_width
+        self.viewport_height = viewport_height
+        self.depth = depth
+        self.start_page = start_page
+        self.page_script_path = page_script_path or DEFAULT_PAGE_SCRIPT_PATH
+        self.user_agent = user_agent
+        if isinstance(request_interception, str):
+            request_interception = get_interception_profile(request_interception)
+        self.request_interception = request_interception
+        self.logger = logger or logging.getLogger("browser_pool")
+        self.stats = WarmContextStats()
+        self._ready: asyncio.Queue[PreparedContext] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(depth)
+        self._producer: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start the background producer, called by the first `get()` if needed."""
+        if self._producer is None or self._producer.done():
+            self._producer = asyncio.create_task(self._produce())
+
+    async def _produce(self) -> None:
+        n_failures = 0
+        while True:
+            await self._slots.acquire()
+            try:
+                prepared = await self._prepare()
+            except Exception as e:
+                self._slots.release()
+                self.stats.failures += 1
+                n_failures += 1
+                self.logger.warning(f"Failed to prepare a browser context: {e}")
+                if n_failures >= self.MAX_FAILURES:
+                    raise
+                await asyncio.sleep(self.RETRY_SECONDS)
+                continue
+            n_failures = 0
+            self._ready.put_nowait(prepared)
+
+    async def _prepare(self) -> PreparedContext:
+        start = time.perf_counter()
+        browser, context = await self.pool.new_context(user_agent=self.user_agent)
+        interceptor = None
+        try:
+            if self.request_interception is not None:
+                interceptor = RequestInterceptor(
+                    self.request_interception, logger=self.logger
+                )
+                await context.route("**/*", interceptor.handle)
+            context.set_default_timeout(self.DEFAULT_TIMEOUT)
+            page = await context.new_page()
+            await page.set_viewport_size(
+                {"width": self.viewport_width, "height": self.viewport_height}
+            )
+            await page.add_init_script(script=read_page_script(self.page_script_path))
+            if self.start_page:
+                await page.goto(self.start_page)
+                await page.wait_for_load_state()
+        except BaseException:
+            await self._discard(browser, context)
+            raise
+        seconds = time.perf_counter() - start
+        self.stats.prepared += 1
+        self.stats.prepare_seconds += seconds
+        return PreparedContext(
+            browser, context, page, self.start_page, seconds, interceptor
+        )
+
+    async def _discard(self, browser: Browser, context: BrowserContext) -> None:
+        try:
+            await context.close()
+        except Exception:
+            pass
+        self.pool.release(browser)
+
+    async def _next(self, timeout: float | None) -> PreparedContext:
+        getter = asyncio.ensure_future(self._ready.get())
+        done, _ = await asyncio.wait(
+            {getter, self._producer},
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if getter in done:
+            return getter.result()
+        getter.cancel()
+        if self._producer in done:
+            self.stats.errors += 1
+            raise RuntimeError(
+                f"Gave up preparing browser contexts after {self.MAX_FAILURES} failures"
+            ) from self._producer.exception()
+        self.stats.timeouts += 1
+        raise asyncio.TimeoutError(f"No prepared browser context within {timeout}s")
+
+    async def get(self, timeout: float | None = None) -> PreparedContext:
+        """Take a prepared context; its browser goes back with `pool.release()`.
+
+        Raises:
+            asyncio.TimeoutError: if no context is ready within `timeout` seconds.
+            RuntimeError: if the producer gave up, see `MAX_FAILURES`.
+        """
+        self.start()
+        while True:
+            start = time.perf_counter()
+            hit = not self._ready.empty()
+            prepared = await self._next(timeout)
+            self._slots.release()
+            if prepared.page.is_closed() or not prepared.browser.is_connected():
+                self.stats.discarded += 1
+                await self._discard(prepared.browser, prepared.context)
+                continue
+            if hit:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+                self.stats.wait_seconds += time.perf_counter() - start
+            return prepared
+
+    async def close(self) -> None:
+        """Stop the producer and close the contexts not taken."""
+        self.logger.info(f"Closing warm context queue: {self.stats}")
+        if self._producer is not None:
+            self._producer.cancel()
+            try:
+                await self._producer
+            except asyncio.CancelledError:
+                pass
+            self._producer = None
+        while not self._ready.empty():
+            prepared = self._ready.get_nowait()
+            await self._discard(prepared.browser, prepared.context)
+        self._slots = asyncio.Semaphore(self.depth)
@@ -0,0 +1,256 @@
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from playwright.async_api import Request, Route
+
+# not replayed from the cache: the body is stored decoded, and cookies stay per context
+_DROPPED_HEADERS = {
+    "content-encoding",
+    "content-length",
+    "transfer-encoding",
+    "connection",
+    "set-cookie",
+}
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*(\d+)")
+
+
+@dataclass
+class HttpCacheStats:
+    """Requests served by an HttpCache"""
+
+    requests: int = 0
+    hits: int = 0
+    # stale entries confirmed by the server with a 304
+    revalidated: int = 0
+    misses: int = 0
+    stored: int = 0
+    evicted: int = 0
+    # body bytes served from disk instead of the network
+    bytes_saved: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        return (self.hits + self.revalidated) / self.requests if self.requests else 0.0
+
+
+def _freshness_lifetime(headers: Dict[str, str]) -> float | None:
+    """Seconds a response may be served without revalidation, None if it must not
+    be stored. The cache is shared across sessions, so `private` responses, meant
+    for a single user, are not stored either."""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return float(match.group(1))
+    if "expires" in headers:
+        try:
+            expires = email.utils.parsedate_to_datetime(headers["expires"])
+        except (TypeError, ValueError):
+            return 0.0
+        return max(0.0, expires.timestamp() - time.time())
+    return 0.0
+
+
+class HttpCache:
+    """On-disk HTTP cache of static responses, shared by browser contexts and by
+    worker processes that use the same `root`.
+
+    Installed as a route handler on a context, it serves GET requests of
+    `resource_types` from disk while they are fresh (Cache-Control max-age or
+    Expires), revalidates stale entries with their ETag / Last-Modified, and stores
+    new cacheable 200 responses. Each entry is one file, written atomically and
+    named after the SHA-256 of the URL. File modification times serve as access
+    times: once the cache grows past `max_bytes`, the least recently used entries
+    are evicted. The size of the cache is rescanned every `RESCAN_WRITES` stores, to
+    account for what other processes stored. Other requests go on with
+    `route.fallback()`.
+    """
+
+    DEFAULT_RESOURCE_TYPES = frozenset({"script", "stylesheet", "image", "font"})
+    RESCAN_WRITES = 100
+
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        resource_types: FrozenSet[str] = DEFAULT_RESOURCE_TYPES,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.resource_types = resource_types
+        self.logger = logger or logging.getLogger("browser_manager")
+        self.stats = HttpCacheStats()
+        # size of the cache on disk, as last scanned plus what this process stored
+        self._bytes: int | None = None
+        self._writes_since_scan = 0
+        # disk writes run in worker threads
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.entry")
+
+    def _read(self, path: str) -> Tuple[Dict[str, Any], bytes] | None:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mark as recently used for the LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        meta, _, body = data.partition(b"\n")
+        return json.loads(meta), body
+
+    def _write(self, path: str, meta: Dict[str, Any], body: bytes) -> int:
+        """Returns the size of the entry file."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            data = json.dumps(meta).encode("utf-8") + b"\n" + body
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # atomic, readers in other processes see the old entry or the new one
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return len(data)
+
+    def _store(self, path: str, meta: Dict[str, Any], body: bytes) -> None:
+        size = self._write(path, meta, body)
+        with self._lock:
+            self._writes_since_scan += 1
+            if self._bytes is None or self._writes_since_scan >= self.RESCAN_WRITES:
+                self._bytes = self._scan_size()
+                self._writes_since_scan = 0
+            else:
+                self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".entry"):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries down to 90% of `max_bytes`."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats.evicted += 1
+        self._bytes = total
+
+    @staticmethod
+    def _count(stats: List[HttpCacheStats], name: str, n: int = 1) -> None:
+        for s in stats:
+            setattr(s, name, getattr(s, name) + n)
+
+    async def handle(
+        self, route: Route, request: Request, stats: HttpCacheStats | None = None
+    ) -> None:
+        """Route handler; `stats` are updated along with the cache-wide stats."""
+        if request.method != "GET" or request.resource_type not in self.resource_types:
+            await route.fallback()
+            return
+        counters = [self.stats] if stats is None else [self.stats, stats]
+        self._count(counters, "requests")
+        path = self._path(request.url)
+        entry = await asyncio.to_thread(self._read, path)
+        if entry is not None:
+            meta, body = entry
+            if meta["expires_at"] > time.time():
+                self._count(counters, "hits")
+                self._count(counters, "bytes_saved", len(body))
+                await route.fulfill(
+                    status=meta["status"], headers=meta["headers"], body=body
+                )
+                return
+
+        validators = {}
+        if entry is not None:
+            if meta.get("etag"):
+                validators["if-none-match"] = meta["etag"]
+            if meta.get("last_modified"):
+                validators["if-modified-since"] = meta["last_modified"]
+        try:
+            response = await route.fetch(
+                headers={**request.headers, **validators} if validators else None
+            )
+        except Exception as e:
+            self.logger.debug(f"Cache fetch of {request.url} failed: {e}")
+            await route.fallback()
+            return
+
+        headers = {k.lower(): v for k, v in response.headers.items()}
+        if response.status == 304 and entry is not None:
+            lifetime = _freshness_lifetime(headers) or 0.0
+            meta["expires_at"] = time.time() + lifetime
+            await asyncio.to_thread(self._write, path, meta, body)
+            self._count(counters, "revalidated")
+            self._count(counters, "bytes_saved", len(body))
+            await route.fulfill(
+                status=meta["status"], headers=meta["headers"], body=body
+            )
+            return
+
+        self._count(counters, "misses")
+        lifetime = _freshness_lifetime(headers)
+        cacheable = (
+            response.status == 200
+            and lifetime is not None
+            and headers.get("vary", "accept-encoding").lower() == "accept-encoding"
+            and (lifetime > 0 or "etag" in headers or "last-modified" in headers)
+        )
+        if not cacheable:
+            # served as fetched, with its own headers
+            await route.fulfill(response=response)
+            return
+        body = await response.body()
+        stored_headers = {k: v for k, v in headers.items() if k not in _DROPPED_HEADERS}
+        meta = {
+            "url": request.url,
+            "status": response.status,
+            "headers": stored_headers,
+            "expires_at": time.time() + lifetime,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+        }
+        await asyncio.to_thread(self._store, path, meta, body)
+        self._count(counters, "stored")
+        await route.fulfill(status=response.status, headers=stored_headers, body=body)
@@ -0,0 +1,163 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Request, Route
+
+# Ad, analytics and tracking hosts, blocked with their subdomains
+DEFAULT_BLOCKED_DOMAINS = frozenset(
+    {
+        "doubleclick.net",
+        "googlesyndication.com",
+        "googleadservices.com",
+        "google-analytics.com",
+        "googletagmanager.com",
+        "googletagservices.com",
+        "adservice.google.com",
+        "amazon-adsystem.com",
+        "adnxs.com",
+        "adsrvr.org",
+        "criteo.com",
+        "criteo.net",
+        "taboola.com",
+        "outbrain.com",
+        "scorecardresearch.com",
+        "quantserve.com",
+        "moatads.com",
+        "rubiconproject.com",
+        "pubmatic.com",
+        "openx.net",
+        "casalemedia.com",
+        "hotjar.com",
+        "newrelic.com",
+        "nr-data.net",
+        "segment.io",
+        "connect.facebook.net",
+        "bat.bing.com",
+        "clarity.ms",
+    }
+)
+
+
+# Typical transfer size of one response per Playwright resource type, in bytes,
+# rounded from HTTP Archive medians. Requests blocked before they are sent have no
+# size, their savings are estimated with these
+TYPICAL_RESPONSE_BYTES = {
+    "document": 30_000,
+    "stylesheet": 10_000,
+    "script": 20_000,
+    "image": 12_000,
+    "font": 30_000,
+    "media": 200_000,
+    "xhr": 2_000,
+    "fetch": 2_000,
+}
+DEFAULT_RESPONSE_BYTES = 2_000
+
+
+@dataclass(frozen=True)
+class InterceptionProfile:
+    """Which requests a page may not make.
+
+    Requests to `blocked_domains` (or their subdomains) and of
+    `blocked_resource_types` (Playwright resource types) are aborted. Requests of
+    `size_checked_resource_types` are first sent as HEAD and aborted if their
+    Content-Length exceeds `max_response_bytes`.
+    """
+
+    blocked_domains: FrozenSet[str] = DEFAULT_BLOCKED_DOMAINS
+    blocked_resource_types: FrozenSet[str] = frozenset()
+    max_response_bytes: int | None = None
+    size_checked_resource_types: FrozenSet[str] = frozenset({"media"})
+
+    def block_reason(self, url: str, resource_type: str) -> str | None:
+        if resource_type in self.blocked_resource_types:
+            return "resource_type"
+        host = urlparse(url).hostname or ""
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            if ".".join(labels[i:]) in self.blocked_domains:
+                return "domain"
+        return None
+
+
+def get_interception_profile(name: str) -> InterceptionProfile:
+    """Build an interception profile from its name."""
+    if name == "ads":
+        return InterceptionProfile()
+    elif name == "lean":
+        # media is size-checked with a HEAD request, too costly for every image
+        return InterceptionProfile(
+            blocked_resource_types=frozenset({"font"}),
+            max_response_bytes=2 * 1024 * 1024,
+        )
+    else:
+        raise ValueError(
+            f"Unknown interception profile: {name}. Available options: ['ads', 'lean']"
+        )
+
+
+@dataclass
+class InterceptionStats:
+    """Requests seen and blocked by a RequestInterceptor"""
+
+    requests: int = 0
+    blocked: int = 0
+    blocked_by: Dict[str, int] = field(default_factory=dict)
+    # Content-Length of the responses blocked for their size
+    size_blocked_bytes: int = 0
+    # requests blocked for their domain or resource type are never sent, their size
+    # is estimated from their resource type, see TYPICAL_RESPONSE_BYTES
+    estimated_blocked_bytes: int = 0
+
+    @property
+    def blocked_bytes(self) -> int:
+        """Bytes not downloaded, measured for size blocks and estimated otherwise"""
+        return self.size_blocked_bytes + self.estimated_blocked_bytes
+
+
+class RequestInterceptor:
+    """Route handler applying an InterceptionProfile to a browser context.
+
+    Requests that are not blocked go on with `route.fallback()`, so that route
+    handlers registered before this one still see them.
+    """
+
+    def __init__(
+        self, profile: InterceptionProfile, logger: Optional[logging.Logger] = None
+    ):
+        self.profile = profile
+        self.logger = logger or logging.getLogger("browser_manager")
+        self.stats = InterceptionStats()
+
+    def _record_block(self, reason: str) -> None:
+        self.stats.blocked += 1
+        self.stats.blocked_by[reason] = self.stats.blocked_by.get(reason, 0) + 1
+
+    async def handle(self, route: Route, request: Request) -> None:
+        self.stats.requests += 1
+        reason = self.profile.block_reason(request.url, request.resource_type)
+        if reason is not None:
+            self._record_block(reason)
+            self.stats.estimated_blocked_bytes += TYPICAL_RESPONSE_BYTES.get(
+                request.resource_type, DEFAULT_RESPONSE_BYTES
+            )
+            await route.abort("blockedbyclient")
+            return
+        if (
+            self.profile.max_response_bytes is not None
+            and request.resource_type in self.profile.size_checked_resource_types
+        ):
+            try:
+                head = await route.fetch(method="HEAD")
+                length = int(head.headers.get("content-length", 0))
+            except Exception as e:
+                self.logger.debug(f"Size check of {request.url} failed: {e}")
+                length = 0
+            if length > self.profile.max_response_bytes:
+                self._record_block("size")
+                self.stats.size_blocked_bytes += length
+                await route.abort("blockedbyclient")
+                return
+        await route.fallback()
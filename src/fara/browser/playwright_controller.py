@@ -4,10 +4,13 @@ import os
 import random
 import logging
 import functools
-from typing import Any, Callable, Optional, Tuple, Union, TypeVar, Awaitable
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple, Union, TypeVar, Awaitable
 
 from playwright._impl._errors import Error as PlaywrightError
-from playwright._impl._errors import TimeoutError, TargetClosedError
+from playwright._impl._errors import TargetClosedError
 from playwright.async_api import Download, Page
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
@@ -246,6 +249,50 @@ def handle_target_closed_with_context(max_retries: int = 2, timeout_secs: int =
     return decorator
 
 
+@dataclass
+class PageReadiness:
+    """What has already been done for a page by `on_new_page`."""
+
+    handlers_attached: bool = False
+    viewport_set: bool = False
+    # incremented on every main-frame navigation
+    navigation_id: int = 0
+    # navigation_id at the time the page was last known to be loaded
+    ready_navigation_id: int = -1
+
+
+@dataclass
+class ReadinessStats:
+    """How often `_ensure_page_ready` ran each of its paths."""
+
+    full: int = 0
+    load_wait: int = 0
+    cached: int = 0
+
+
+@dataclass
+class PageObservation:
+    """Everything observed about a page after an action, with per-component timings in seconds."""
+
+    screenshot: bytes
+    url: str
+    title: str = ""
+    metadata: Dict[str, Any] | None = None
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+# Title and, if requested and page_script.js is loaded, the page metadata in one evaluate
+OBSERVATION_JS = """
+(includeMetadata) => {
+    let metadata = null;
+    if (includeMetadata && typeof MultimodalWebSurfer !== "undefined") {
+        metadata = MultimodalWebSurfer.getPageMetadata();
+    }
+    return {title: document.title, metadata: metadata};
+}
+"""
+
+
 class PlaywrightController:
     def __init__(
         self,
@@ -258,6 +305,7 @@ class PlaywrightController:
         single_tab_mode: bool = False,
         sleep_after_action: int = 10,
         timeout_load: int = 1,
+        popup_grace_period: float = 0.25,
         logger=None,
     ) -> None:
         """
@@ -269,6 +317,7 @@ class PlaywrightController:
         _download_handler: A handler for downloads.
         to_resize_viewport: If True, the viewport will be resized.
         single_tab_mode (bool): If True, forces navigation to happen in the same tab rather than opening new tabs/windows.
+        popup_grace_period: Seconds a click or text entry waits for a popup that has not arrived yet.
 
         """
         self.animate_actions = animate_actions
@@ -280,36 +329,117 @@ class PlaywrightController:
         self.single_tab_mode = single_tab_mode
         self._sleep_after_action = sleep_after_action
         self._timeout_load = timeout_load
+        self._popup_grace_period = popup_grace_period
         self.logger = logger or logging.getLogger("playwright_controller")
 
+        # Per-page readiness, so the full on_new_page path only runs when needed
+        self._page_states: "weakref.WeakKeyDictionary[Page, PageReadiness]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.readiness_stats = ReadinessStats()
+
+        # Popups are recorded by a listener on every page instead of waiting on each action
+        self._popup_arrived = asyncio.Event()
+        self._last_popup: Page | None = None
+
         # Set up the download handler
         self.last_cursor_position: Tuple[float, float] = (0.0, 0.0)
 
     async def sleep(self, page: Page, duration: Union[int, float]) -> None:
         await asyncio.sleep(duration)
 
+    def _on_popup(self, popup: Page) -> None:
+        self._last_popup = popup
+        self._popup_arrived.set()
+
+    def _on_download(self, download: Download) -> None:
+        if self._download_handler is not None:
+            self._download_handler(download)
+
+    def _attach_page_listeners(self, page: Page, state: PageReadiness) -> None:
+        def _on_frame_navigated(frame) -> None:
+            if frame.parent_frame is None:
+                state.navigation_id += 1
+
+        page.on("download", self._on_download)  # type: ignore
+        page.on("popup", self._on_popup)  # type: ignore
+        page.on("framenavigated", _on_frame_navigated)  # type: ignore
+        state.handlers_attached = True
+
+    def _reset_popup(self) -> None:
+        """Forget earlier popups, call right before an action that may open one."""
+        self._last_popup = None
+        self._popup_arrived.clear()
+
+    async def _take_popup(self) -> Page | None:
+        """Return the popup opened since `_reset_popup`, waiting at most the grace period."""
+        if not self._popup_arrived.is_set() and self._popup_grace_period > 0:
+            try:
+                await asyncio.wait_for(
+                    self._popup_arrived.wait(), timeout=self._popup_grace_period
+                )
+            except asyncio.TimeoutError:
+                pass
+        new_page, self._last_popup = self._last_popup, None
+        if new_page is not None:
+            await self.on_new_page(new_page)
+        return new_page
+
+    def adopt_page(self, page: Page, loaded: bool) -> None:
+        """Track a page prepared elsewhere with the viewport already set, and already
+        loaded if `loaded`, so that it needs no `on_new_page` before being observed."""
+        state = self._page_states.setdefault(page, PageReadiness())
+        if not state.handlers_attached:
+            self._attach_page_listeners(page, state)
+        state.viewport_set = True
+        if loaded:
+            state.ready_navigation_id = state.navigation_id
+
     @handle_target_closed()
     async def on_new_page(self, page: Page) -> None:
         assert page is not None
+        self.readiness_stats.full += 1
+        state = self._page_states.setdefault(page, PageReadiness())
         # bring page to front just in case
         await page.bring_to_front()
-        page.on("download", self._download_handler)  # type: ignore
-        if self.to_resize_viewport and self.viewport_width and self.viewport_height:
+        if not state.handlers_attached:
+            self._attach_page_listeners(page, state)
+        if (
+            self.to_resize_viewport
+            and self.viewport_width
+            and self.viewport_height
+            and not state.viewport_set
+        ):
             await page.set_viewport_size(
                 {"width": self.viewport_width, "height": self.viewport_height}
             )
+            state.viewport_set = True
         await self.sleep(page, 0.2)
+        await self._wait_for_page_load(page, state)
+
+    async def _wait_for_page_load(self, page: Page, state: PageReadiness) -> None:
+        navigation_id = state.navigation_id
         try:
             await page.wait_for_load_state(timeout=30000)
         except PlaywrightTimeoutError:
             self.logger.error("WARNING: Page load timeout, page might not be loaded")
             # stop page loading
             await page.evaluate("window.stop()")
+        state.ready_navigation_id = navigation_id
 
     @handle_target_closed()
     async def _ensure_page_ready(self, page: Page) -> None:
+        """Run the parts of `on_new_page` that are invalidated: everything for a page
+        never seen before, only the load wait after a navigation, nothing otherwise."""
         assert page is not None
-        await self.on_new_page(page)
+        state = self._page_states.get(page)
+        if state is None or not state.handlers_attached:
+            await self.on_new_page(page)
+        elif state.ready_navigation_id != state.navigation_id:
+            self.readiness_stats.load_wait += 1
+            await self._wait_for_page_load(page, state)
+        else:
+            self.readiness_stats.cached += 1
 
     @handle_target_closed()
     async def get_screenshot(self, page: Page, path: str | None = None) -> bytes:
@@ -321,6 +451,9 @@ class PlaywrightController:
             path (str, optional): The file path to save the screenshot. If None, the screenshot will be returned as bytes. Default: None
         """
         await self._ensure_page_ready(page)
+        return await self._capture_screenshot(page, path)
+
+    async def _capture_screenshot(self, page: Page, path: str | None = None) -> bytes:
         try:
             screenshot = await page.screenshot(path=path, timeout=15000)
             return screenshot
@@ -330,6 +463,49 @@ class PlaywrightController:
             screenshot = await page.screenshot(path=path, timeout=15000)
             return screenshot
 
+    @handle_target_closed()
+    async def get_observation(
+        self, page: Page, include_metadata: bool = False
+    ) -> PageObservation:
+        """
+        Capture the screenshot, URL, title and optionally the page_script.js metadata concurrently.
+
+        Args:
+            page (Page): The Playwright page object.
+            include_metadata (bool): Whether to include MultimodalWebSurfer.getPageMetadata(). Default: False
+        """
+        start = time.perf_counter()
+        await self._ensure_page_ready(page)
+        timings = {"ready": time.perf_counter() - start}
+
+        async def _timed(name: str, coro: Awaitable[Any]) -> Any:
+            component_start = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                timings[name] = time.perf_counter() - component_start
+
+        async def _evaluate_page_info() -> Dict[str, Any]:
+            try:
+                return await page.evaluate(OBSERVATION_JS, include_metadata)
+            except PlaywrightError as e:
+                # e.g. the execution context was destroyed by a navigation
+                self.logger.warning(f"Could not read page title/metadata: {e}")
+                return {"title": "", "metadata": None}
+
+        screenshot, page_info = await asyncio.gather(
+            _timed("screenshot", self._capture_screenshot(page)),
+            _timed("page_info", _evaluate_page_info()),
+        )
+        timings["total"] = time.perf_counter() - start
+        return PageObservation(
+            screenshot=screenshot,
+            url=page.url,
+            title=page_info.get("title") or "",
+            metadata=page_info.get("metadata"),
+            timings=timings,
+        )
+
     @handle_target_closed()
     async def back(self, page: Page) -> None:
         await self._ensure_page_ready(page)
@@ -432,8 +608,7 @@ class PlaywrightController:
         await asyncio.sleep(1.0)
 
     @handle_target_closed()
-    async def click_coords(self, page: Page, x: float, y: float) -> None:
-        new_page: Page | None = None
+    async def click_coords(self, page: Page, x: float, y: float) -> Page | None:
         await self._ensure_page_ready(page)
 
         if self.animate_actions:
@@ -442,26 +617,10 @@ class PlaywrightController:
             await self.gradual_cursor_animation(page, start_x, start_y, x, y)
             await asyncio.sleep(0.1)
 
-            try:
-                # Give it a chance to open a new page
-                async with page.expect_event("popup", timeout=1000) as page_info:  # type: ignore
-                    await page.mouse.click(x, y, delay=10)
-                    new_page = await page_info.value  # type: ignore
-                    assert isinstance(new_page, Page)
-                    await self.on_new_page(new_page)
-            except TimeoutError:
-                pass
-        else:
-            try:
-                # Give it a chance to open a new page
-                async with page.expect_event("popup", timeout=1000) as page_info:  # type: ignore
-                    await page.mouse.click(x, y, delay=10)
-                    new_page = await page_info.value  # type: ignore
-                    assert isinstance(new_page, Page)
-                    await self.on_new_page(new_page)
-            except TimeoutError:
-                pass
-        return new_page
+        self._reset_popup()
+        await page.mouse.click(x, y, delay=10)
+        # Give it a chance to open a new page
+        return await self._take_popup()
 
     @handle_target_closed()
     async def hover_coords(self, page: Page, x: float, y: float) -> None:
@@ -492,9 +651,8 @@ class PlaywrightController:
         value: str,
         press_enter: bool = True,
         delete_existing_text: bool = False,
-    ) -> None:
+    ) -> Page | None:
         await self._ensure_page_ready(page)
-        new_page: Page | None = None
 
         if self.animate_actions:
             # Move cursor to the box slowly
@@ -514,38 +672,15 @@ class PlaywrightController:
         else:
             delay_typing_speed = 10
 
-        if self.animate_actions:
-            try:
-                # Give it a chance to open a new page
-                async with page.expect_event("popup", timeout=1000) as page_info:  # type: ignore
-                    try:
-                        await page.keyboard.type(value)
-                    except PlaywrightError:
-                        await page.keyboard.type(value, delay=delay_typing_speed)
-                    if press_enter:
-                        await page.keyboard.press("Enter")
-                    new_page = await page_info.value  # type: ignore
-                    assert isinstance(new_page, Page)
-                    await self.on_new_page(new_page)
-            except TimeoutError:
-                pass
-        else:
-            try:
-                # Give it a chance to open a new page
-                async with page.expect_event("popup", timeout=1000) as page_info:  # type: ignore
-                    try:
-                        await page.keyboard.type(value)
-                    except PlaywrightError:
-                        await page.keyboard.type(value, delay=delay_typing_speed)
-                    if press_enter:
-                        await page.keyboard.press("Enter")
-                    new_page = await page_info.value  # type: ignore
-                    assert isinstance(new_page, Page)
-                    await self.on_new_page(new_page)
-            except TimeoutError:
-                pass
-
-        return new_page
+        self._reset_popup()
+        try:
+            await page.keyboard.type(value)
+        except PlaywrightError:
+            await page.keyboard.type(value, delay=delay_typing_speed)
+        if press_enter:
+            await page.keyboard.press("Enter")
+        # Give it a chance to open a new page
+        return await self._take_popup()
 
     async def keypress(self, page: Page, keys: list[str]) -> None:
         """
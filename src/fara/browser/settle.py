@@ -0,0 +1,150 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict
+
+from playwright._impl._errors import Error as PlaywrightError
+from playwright.async_api import Page
+
+from .playwright_controller import PlaywrightController
+
+# Resolves once the DOM has seen no mutations for quietMs, or after maxMs at the latest
+DOM_QUIET_JS = """
+([quietMs, maxMs]) => new Promise((resolve) => {
+    let quietTimer = null;
+    let capTimer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(done, quietMs);
+    });
+    function done() {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(capTimer);
+        resolve();
+    }
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    quietTimer = setTimeout(done, quietMs);
+    capTimer = setTimeout(done, maxMs);
+})
+"""
+
+
+class SettlePolicy(ABC):
+    """Decides how long to wait after an action before the page is observed again."""
+
+    @abstractmethod
+    async def settle(
+        self, controller: PlaywrightController, page: Page, action: str
+    ) -> None:
+        raise NotImplementedError
+
+
+class FixedSettlePolicy(SettlePolicy):
+    """Always wait a fixed number of seconds (the historical behavior)."""
+
+    def __init__(self, seconds: float = 3.0):
+        self.seconds = seconds
+
+    async def settle(
+        self, controller: PlaywrightController, page: Page, action: str
+    ) -> None:
+        if self.seconds > 0:
+            await controller.sleep(page, self.seconds)
+
+
+class NetworkQuietSettlePolicy(SettlePolicy):
+    """Wait for the network to be idle, for at most `timeout_secs`."""
+
+    def __init__(self, timeout_secs: float = 3.0):
+        self.timeout_secs = timeout_secs
+
+    async def settle(
+        self, controller: PlaywrightController, page: Page, action: str
+    ) -> None:
+        try:
+            await page.wait_for_load_state(
+                "networkidle", timeout=self.timeout_secs * 1000
+            )
+        except PlaywrightError:
+            # busy pages (ads, long polling) never go idle, the cap is good enough
+            pass
+
+
+class DomQuietSettlePolicy(SettlePolicy):
+    """Wait until the DOM stops changing for `quiet_ms`, for at most `max_wait_secs`."""
+
+    def __init__(self, quiet_ms: int = 300, max_wait_secs: float = 3.0):
+        self.quiet_ms = quiet_ms
+        self.max_wait_secs = max_wait_secs
+
+    async def settle(
+        self, controller: PlaywrightController, page: Page, action: str
+    ) -> None:
+        try:
+            await asyncio.wait_for(
+                page.evaluate(
+                    DOM_QUIET_JS, [self.quiet_ms, int(self.max_wait_secs * 1000)]
+                ),
+                timeout=self.max_wait_secs + 1,
+            )
+        except (PlaywrightError, asyncio.TimeoutError) as e:
+            # a navigation destroys the execution context, which means the page changed
+            controller.logger.debug(f"DomQuietSettlePolicy: stopped waiting: {e}")
+
+
+class PerActionSettlePolicy(SettlePolicy):
+    """Pick a settle policy based on the action that was just executed."""
+
+    def __init__(self, table: Dict[str, SettlePolicy], default: SettlePolicy):
+        self.table = table
+        self.default = default
+
+    async def settle(
+        self, controller: PlaywrightController, page: Page, action: str
+    ) -> None:
+        await self.table.get(action, self.default).settle(controller, page, action)
+
+
+def default_per_action_policy() -> PerActionSettlePolicy:
+    """Skip waiting for actions that do not touch the page, short DOM-quiet waits for
+    in-page interactions and network-quiet waits for navigations."""
+    no_wait = FixedSettlePolicy(0)
+    light = DomQuietSettlePolicy(quiet_ms=200, max_wait_secs=1.0)
+    interaction = DomQuietSettlePolicy(quiet_ms=300, max_wait_secs=3.0)
+    navigation = NetworkQuietSettlePolicy(timeout_secs=3.0)
+    table = {
+        "pause_and_memorize_fact": no_wait,
+        "stop": no_wait,
+        "terminate": no_wait,
+        "sleep": no_wait,
+        "wait": no_wait,
+        "hover": light,
+        "mouse_move": light,
+        "scroll": light,
+        "key": interaction,
+        "keypress": interaction,
+        "click": interaction,
+        "left_click": interaction,
+        "type": interaction,
+        "input_text": interaction,
+        "visit_url": navigation,
+        "web_search": navigation,
+        "history_back": navigation,
+    }
+    return PerActionSettlePolicy(table, default=interaction)
+
+
+def get_settle_policy(name: str) -> SettlePolicy:
+    """Build a settle policy from its name."""
+    if name == "fixed":
+        return FixedSettlePolicy()
+    elif name == "network_quiet":
+        return NetworkQuietSettlePolicy()
+    elif name == "dom_quiet":
+        return DomQuietSettlePolicy()
+    elif name == "per_action":
+        return default_per_action_policy()
+    else:
+        raise ValueError(
+            f"Unknown settle policy: {name}. Available options: ['fixed', 'network_quiet', 'dom_quiet', 'per_action']"
+        )
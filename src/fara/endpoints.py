@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+# hosted APIs that reject vLLM's extra request parameters
+HOSTED_API_DOMAINS = ("openai.com", "azure.com")
+
+
+def is_vllm(config: dict) -> bool:
+    """Whether an endpoint config points at a vLLM server.
+
+    Set `"vllm": true` or `false` in the config to say so explicitly; otherwise any
+    endpoint outside the hosted OpenAI and Azure APIs is assumed to be vLLM.
+    """
+    if "vllm" in config:
+        return bool(config["vllm"])
+    host = urlparse(config.get("base_url") or "").hostname
+    if host is None:
+        return False
+    return not any(
+        host == domain or host.endswith("." + domain) for domain in HOSTED_API_DOMAINS
+    )
+
+
+class Endpoint:
+    """One OpenAI-compatible server, with its client and latency statistics."""
+
+    def __init__(self, config: dict, max_samples: int = 100):
+        self.config = config
+        self.model = config.get("model", "gpt-4o")
+        self.base_url = config.get("base_url")
+        self.vllm = is_vllm(config)
+        self.client = AsyncOpenAI(api_key=config.get("api_key"), base_url=self.base_url)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+        self.latencies: Deque[float] = deque(maxlen=max_samples)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def mean_latency(self) -> float | None:
+        if not self.latencies:
+            return None
+        return sum(self.latencies) / len(self.latencies)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "wins": self.wins,
+            "in_flight": self.in_flight,
+            "mean_latency": self.mean_latency,
+            "p95_latency": self.percentile(0.95),
+        }
+
+
+class EndpointPool:
+    """Routes model requests over several endpoints and hedges slow ones.
+
+    A request goes to the least loaded endpoint (fewest requests in flight, then
+    lowest mean latency, then fewest requests, ties broken at random). If it has not answered after the endpoint's
+    `hedge_percentile` latency, a duplicate is sent to the next best endpoint; the
+    first valid answer wins and the other request is cancelled. A failure or an
+    invalid answer moves on to another endpoint immediately instead of waiting for a
+    retry; if every answer is invalid the last one is returned.
+
+    Until an endpoint has `min_samples` latencies, `initial_hedge_delay` is used.
+    """
+
+    def __init__(
+        self,
+        configs: List[dict],
+        hedge_percentile: float = 0.95,
+        initial_hedge_delay: float = 10.0,
+        min_samples: int = 10,
+        max_attempts: int = 2,
+        logger: logging.Logger | None = None,
+    ):
+        if not configs:
+            raise ValueError("EndpointPool needs at least one endpoint config")
+        self.endpoints = [Endpoint(config) for config in configs]
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self.hedges = 0
+        self.logger = logger or logging.getLogger(__name__)
+
+    def pick(self, exclude: List[Endpoint] | None = None) -> Endpoint | None:
+        candidates = [e for e in self.endpoints if e not in (exclude or [])]
+        if not candidates:
+            return None
+
+        def load(e: Endpoint) -> Tuple[int, float, int]:
+            return e.in_flight, e.mean_latency or 0.0, e.requests
+
+        best = min(load(e) for e in candidates)
+        # at random among equals, so that fresh pools do not all start on the first
+        return random.choice([e for e in candidates if load(e) == best])
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        if len(endpoint.latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return endpoint.percentile(self.hedge_percentile)
+
+    async def _attempt(
+        self, endpoint: Endpoint, fn: Callable[[Endpoint], Awaitable[T]]
+    ) -> T:
+        endpoint.in_flight += 1
+        endpoint.requests += 1
+        start = time.perf_counter()
+        try:
+            result = await fn(endpoint)
+        except asyncio.CancelledError:
+            # a request that lost to its hedge took at least this long; without the
+            # sample a slow endpoint would keep looking unmeasured, i.e. fastest
+            endpoint.latencies.append(time.perf_counter() - start)
+            raise
+        except Exception:
+            endpoint.failures += 1
+            raise
+        finally:
+            endpoint.in_flight -= 1
+        endpoint.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def request(
+        self,
+        fn: Callable[[Endpoint], Awaitable[T]],
+        is_valid: Callable[[T], bool] | None = None,
+    ) -> T:
+        """Run `fn(endpoint)` with hedging and return the first valid result."""
+        tasks: Dict[asyncio.Task, Endpoint] = {}
+        used: List[Endpoint] = []
+        last_error: BaseException | None = None
+        invalid: List[T] = []
+
+        def launch() -> Endpoint | None:
+            endpoint = self.pick(exclude=used)
+            if endpoint is None or len(used) >= self.max_attempts:
+                return None
+            used.append(endpoint)
+            tasks[asyncio.create_task(self._attempt(endpoint, fn))] = endpoint
+            return endpoint
+
+        primary = launch()
+        timeout = self.hedge_delay(primary)
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # the pending requests are slow, hedge once on another endpoint
+                    timeout = None
+                    hedge = launch()
+                    if hedge is not None:
+                        self.hedges += 1
+                        self.logger.debug(
+                            f"Hedging model request on {hedge.base_url} after {self.hedge_delay(primary):.2f}s"
+                        )
+                    continue
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        self.logger.warning(
+                            f"Model request to {endpoint.base_url} failed: {last_error}"
+                        )
+                        # fail over right away instead of waiting for the hedge delay
+                        launch()
+                        continue
+                    result = task.result()
+                    if is_valid is not None and not is_valid(result):
+                        self.logger.warning(
+                            f"Invalid model response from {endpoint.base_url}"
+                        )
+                        invalid.append(result)
+                        launch()
+                        continue
+                    endpoint.wins += 1
+                    return result
+        finally:
+            for task in tasks:
+                task.cancel()
+        if invalid:
+            return invalid[-1]
+        raise last_error or RuntimeError("No endpoint available")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {e.base_url: e.stats() for e in self.endpoints}
+
+    async def close(self) -> None:
+        """Close the endpoint clients, on the event loop they were used from."""
+        self.logger.info(
+            f"Closing endpoint pool ({self.hedges} hedged requests): {self.stats()}"
+        )
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
@@ -5,6 +5,7 @@ import json
 import ast
 import io
 import os
+import time
 from PIL import Image
 from typing import List, Tuple, Dict
 from urllib.parse import quote_plus
@@ -13,40 +14,74 @@ from tenacity import retry, stop_after_attempt, wait_exponential, before_sleep_l
 from playwright.async_api import Download
 from playwright.async_api import BrowserContext
 import asyncio
-from .browser.playwright_controller import PlaywrightController
-from ._prompts import get_computer_use_system_prompt
+import copy
+import dataclasses
+from concurrent.futures import Executor, ThreadPoolExecutor
+from .browser.playwright_controller import PlaywrightController, PageObservation
+from .browser.settle import SettlePolicy, FixedSettlePolicy, get_settle_policy
+from ._prompts import DEFAULT_PROCESSOR_IM_CFG, get_compiled_system_prompt
 from .fara_types import (
     LLMMessage,
     SystemMessage,
     UserMessage,
     AssistantMessage,
     ImageObj,
+    ImageRef,
+    EncodeStats,
+    PrefixCacheStats,
+    StreamStats,
+    ModelCallRecord,
+    UsageStats,
+    IMAGE_FORMATS,
     ModelResponse,
     FunctionCall,
     message_to_openai_format,
+    encode_image,
+    decode_and_resize,
     WebSurferEvent,
 )
-from .utils import get_trimmed_url
+from .endpoints import Endpoint, EndpointPool, is_vllm
+from .history import WindowedHistory
+from .progress import ProgressMonitor, screenshot_dhash
+from .tool_calls import (
+    TOOL_CALL_END,
+    TOOL_CALL_START,
+    ToolCallParser,
+    tool_call_regex,
+    truncate_tool_calls,
+)
+from .image_store import ImageStore
+from .utils import LoopLagMonitor, get_trimmed_url
 
 
 class FaraAgent:
     DEFAULT_START_PAGE = "https://www.bing.com/"
 
-    MLM_PROCESSOR_IM_CFG = {
-        "min_pixels": 3136,
-        "max_pixels": 12845056,
-        "patch_size": 14,
-        "merge_size": 2,
-    }
+    MLM_PROCESSOR_IM_CFG = DEFAULT_PROCESSOR_IM_CFG
 
     SCREENSHOT_TOKENS = 1105
+    CHARS_PER_TOKEN = 4
+    HISTORY_MODES = WindowedHistory.MODES
+    IMAGE_PLACEHOLDER = "(older screenshot omitted)"
     USER_MESSAGE = "Here is the next screenshot. Think about what to do next."
+    NO_PROGRESS_POLICIES = ["hint", "stop"]
+    NO_PROGRESS_HINT = (
+        "Your recent actions did not change the page. Do not repeat them: try a "
+        "different approach, or stop if the task cannot be completed."
+    )
+    MAX_NO_PROGRESS_HINTS = 1
+    MULTI_ACTION_HINT = (
+        "You may output up to {max_actions} <tool_call> blocks in one response when "
+        "the later actions do not depend on the result of the earlier ones, e.g. to "
+        "fill several fields of a form. They run in order, and the remaining ones are "
+        "skipped if the page changes."
+    )
     MAX_URL_LENGTH = 100
 
     def __init__(
         self,
         browser_manager: Any,
-        client_config: dict,
+        client_config: dict | List[dict],
         downloads_folder: str | None = None,
         start_page: str | None = "about:blank",
         animate_actions: bool = False,
@@ -56,6 +91,25 @@ class FaraAgent:
         model_call_timeout: int = 20,
         max_rounds: int = 10,
         save_screenshots: bool = False,
+        screenshot_format: str = "png",
+        screenshot_quality: int | None = None,
+        settle_policy: SettlePolicy | str | None = None,
+        image_executor: Executor | None = None,
+        max_image_workers: int = 2,
+        monitor_loop_lag: bool = False,
+        history_store_dir: str | None = None,
+        history_mode: str = "sliding",
+        image_evict_block: int | None = None,
+        stream_responses: bool = False,
+        guided_decoding: bool = False,
+        max_actions_per_turn: int = 1,
+        no_progress_policy: str | None = None,
+        no_progress_window: int = 6,
+        max_seconds: float | None = None,
+        max_prompt_tokens: int | None = None,
+        max_completion_tokens: int | None = None,
+        hedge_percentile: float = 0.95,
+        endpoint_pool: EndpointPool | None = None,
         logger: logging.Logger | None = None,
     ):
         self.downloads_folder = downloads_folder
@@ -65,7 +119,10 @@ class FaraAgent:
         self.start_page = start_page or self.DEFAULT_START_PAGE
         self.animate_actions = animate_actions
         self.browser_manager = browser_manager
+        # a list of configs spreads the model calls over several endpoints, see
+        # EndpointPool; slow requests are hedged after their `hedge_percentile` latency
         self.client_config = client_config
+        self.hedge_percentile = hedge_percentile
         self.max_n_images = max_n_images
         self.fn_call_template = fn_call_template
         self.model_call_timeout = model_call_timeout
@@ -74,6 +131,40 @@ class FaraAgent:
         if save_screenshots and self.downloads_folder is None:
             assert False, "downloads_folder must be set if save_screenshots is True"
         self.save_screenshots = save_screenshots
+        # wire format of screenshots sent to the model; saved files stay PNG
+        if screenshot_format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unknown screenshot_format: {screenshot_format}. Available options: {list(IMAGE_FORMATS)}"
+            )
+        self.screenshot_format = screenshot_format
+        self.screenshot_quality = screenshot_quality
+        # how to wait for the page after each action, defaults to a fixed 3s sleep
+        if settle_policy is None:
+            settle_policy = FixedSettlePolicy(3)
+        elif isinstance(settle_policy, str):
+            settle_policy = get_settle_policy(settle_policy)
+        self.settle_policy = settle_policy
+        # image decode, resize and encode run here instead of on the event loop;
+        # a ProcessPoolExecutor can be passed as well
+        self._owns_image_executor = image_executor is None
+        self._image_executor = image_executor or ThreadPoolExecutor(
+            max_workers=max_image_workers, thread_name_prefix="fara-image"
+        )
+        self.loop_lag_monitor = LoopLagMonitor() if monitor_loop_lag else None
+        # screenshots that leave the image window are released from the chat history,
+        # or spilled here if set so that the trajectory can still be inspected
+        self._image_store = ImageStore(history_store_dir) if history_store_dir else None
+        # "sliding" drops the oldest screenshot turn at every step, "prefix_stable"
+        # keeps every turn and evicts images in blocks, leaving a placeholder, so that
+        # the request prefix stays identical between evictions for the prefix cache
+        if history_mode not in self.HISTORY_MODES:
+            raise ValueError(
+                f"Unknown history_mode: {history_mode}. Available options: {self.HISTORY_MODES}"
+            )
+        self.history_mode = history_mode
+        self.image_evict_block = image_evict_block or max(1, max_n_images - 1)
+        # stream completions and stop the generation as soon as the tool call closes
+        self.stream_responses = stream_responses
         self._facts = []
         self._task_summary = None
         self._num_actions = 0
@@ -83,6 +174,47 @@ class FaraAgent:
         self.viewport_height = 900
         self.viewport_width = 1440
         self.include_input_text_key_args = True
+        # constrain generation to one valid tool call (vLLM guided_regex) and parse
+        # it with a schema-validated parser instead of the lenient fallback
+        self.guided_decoding = guided_decoding
+        # run up to this many tool calls of one response in order; each one is still a
+        # step (WebSurferEvent, screenshot, max_rounds) and a navigation ends the batch
+        self.max_actions_per_turn = max(1, max_actions_per_turn)
+        # detect repeated actions on an unchanged page, then either add a recovery hint
+        # to the next message (and stop if it happens again) or stop right away
+        if no_progress_policy is not None and (
+            no_progress_policy not in self.NO_PROGRESS_POLICIES
+        ):
+            raise ValueError(
+                f"Unknown no_progress_policy: {no_progress_policy}. Available options: {self.NO_PROGRESS_POLICIES}"
+            )
+        self.no_progress_policy = no_progress_policy
+        self._progress_monitor = (
+            ProgressMonitor(window=no_progress_window) if no_progress_policy else None
+        )
+        self._no_progress_hints = 0
+        self._pending_hint: str | None = None
+        # budgets of a run, checked before every model call along with max_rounds
+        # (counted in actions); None means unlimited. Unlike max_rounds, exhausting
+        # one sets `abort_reason` and answers with the memorized facts. Streamed
+        # calls without usage from the server count their estimated tokens
+        self.max_seconds = max_seconds
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_completion_tokens = max_completion_tokens
+        # token usage and model latency, per model call and summed over the run
+        self.model_call_records: List[ModelCallRecord] = []
+        self.usage_stats = UsageStats()
+        self._run_start: float | None = None
+        # seconds from the start of initialize() to the first screenshot of the first run
+        self._init_start: float | None = None
+        self.time_to_first_observation: float | None = None
+        # why the last run stopped before the model terminated it, if it did
+        self.abort_reason: str | None = None
+        self._tool_call_parser = (
+            ToolCallParser(self.include_input_text_key_args)
+            if guided_decoding
+            else None
+        )
 
         def _download_handler(download: Download) -> None:
             self._last_download = download
@@ -90,20 +222,54 @@ class FaraAgent:
         self._download_handler = _download_handler
         self.did_initialize = False
 
-        # OpenAI client will be initialized in initialize()
+        # OpenAI client (or endpoint pool) will be initialized in initialize(); a pool
+        # passed in is shared with other agents, e.g. every task of a worker process,
+        # so that its latency statistics persist. Its clients are bound to the event
+        # loop of their first request, the agents sharing it must run on that loop
         self._openai_client: AsyncOpenAI | None = None
-        self._chat_history: List[LLMMessage] = []
+        self._endpoint_pool: EndpointPool | None = endpoint_pool
+        self._hedges_at_start = 0
+        # screenshots that leave the window are released, see WindowedHistory
+        self._history = WindowedHistory(
+            max_n_images,
+            mode=history_mode,
+            evict_block=self.image_evict_block,
+            placeholder=self.IMAGE_PLACEHOLDER,
+            release=self._release_image,
+        )
+        self._pending_writes: List[asyncio.Task] = []
+        self._last_observation: PageObservation | None = None
+        # image encodes done while serializing the latest model request
+        self.encode_stats = EncodeStats()
+        self.prefix_cache_stats = PrefixCacheStats()
+        self._last_request_messages: List[Dict[str, Any]] = []
 
     async def initialize(self) -> None:
         if self.did_initialize:
             return
+        self._init_start = time.monotonic()
         self._last_download = None
         self._prior_metadata_hash = None
 
         # Initialize OpenAI client
-        self._openai_client = AsyncOpenAI(
-            api_key=self.client_config.get("api_key"),
-            base_url=self.client_config.get("base_url"),
+        if self._endpoint_pool is None and isinstance(self.client_config, list):
+            self._endpoint_pool = EndpointPool(
+                self.client_config,
+                hedge_percentile=self.hedge_percentile,
+                logger=self.logger,
+            )
+        elif self._endpoint_pool is None:
+            self._openai_client = AsyncOpenAI(
+                api_key=self.client_config.get("api_key"),
+                base_url=self.client_config.get("base_url"),
+            )
+
+        # Coordinates are mapped back to the browser's actual viewport
+        self.viewport_width = getattr(
+            self.browser_manager, "viewport_width", self.viewport_width
+        )
+        self.viewport_height = getattr(
+            self.browser_manager, "viewport_height", self.viewport_height
         )
 
         # Set up download handler
@@ -165,32 +331,258 @@ class FaraAgent:
         extra_create_args: Dict[str, Any] | None = None,
     ) -> ModelResponse:
         """Make a model call using OpenAI client"""
-        openai_messages = [message_to_openai_format(msg) for msg in history]
-        request_params = {
-            "model": self.client_config.get("model", "gpt-4o"),
-            "messages": openai_messages,
-        }
+        self.encode_stats.reset()
+        openai_messages = [
+            message_to_openai_format(
+                msg,
+                self.encode_stats,
+                image_format=self.screenshot_format,
+                image_quality=self.screenshot_quality,
+            )
+            for msg in history
+        ]
+        self.logger.debug(
+            f"Serialized {len(openai_messages)} messages, {self.encode_stats.calls} image encodes in {self.encode_stats.seconds:.3f}s, "
+            f"{self.encode_stats.images} {self.screenshot_format} images totaling {self.encode_stats.payload_bytes} bytes "
+            f"({self.encode_stats.saved_bytes} bytes saved on {self.encode_stats.png_bytes} bytes as PNG)"
+        )
+        expected_cached, estimated = self._expected_cached_tokens(openai_messages)
+        request_params = {"messages": openai_messages}
         if extra_create_args:
             request_params.update(extra_create_args)
 
-        response = await self._openai_client.chat.completions.create(**request_params)
-        content = response.choices[0].message.content
+        endpoint = None
+        request_start = time.perf_counter()
+        if self._endpoint_pool is not None:
+
+            async def _complete_on(endpoint: Endpoint):
+                params = {"model": endpoint.model, **request_params}
+                return endpoint, await self._complete(
+                    endpoint.client, params, endpoint.vllm
+                )
+
+            result = await self._endpoint_pool.request(
+                _complete_on,
+                is_valid=lambda result: TOOL_CALL_START in (result[1][0] or ""),
+            )
+            served_by, (content, response_usage, stream_stats) = result
+            endpoint = served_by.base_url
+        else:
+            request_params["model"] = self.client_config.get("model", "gpt-4o")
+            content, response_usage, stream_stats = await self._complete(
+                self._openai_client, request_params, is_vllm(self.client_config)
+            )
         usage = {}
-        if response.usage:
+        if response_usage:
+            usage = {
+                "prompt_tokens": response_usage.prompt_tokens,
+                "completion_tokens": response_usage.completion_tokens,
+                "total_tokens": response_usage.total_tokens,
+            }
+            details = getattr(response_usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", None)
+            if cached_tokens is not None:
+                usage["cached_tokens"] = cached_tokens
+            self._record_prefix_cache(
+                expected_cached, estimated, usage["prompt_tokens"], cached_tokens
+            )
+        elif stream_stats is not None:
+            # a cancelled stream from a server without per-chunk usage ends before the
+            # usage chunk, fall back to the estimate so that token budgets still apply
             usage = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens,
+                "prompt_tokens": estimated,
+                "completion_tokens": stream_stats.tokens_to_action,
+                "total_tokens": estimated + stream_stats.tokens_to_action,
+                "estimated": True,
             }
-        return ModelResponse(content=content, usage=usage)
+            self._record_prefix_cache(expected_cached, estimated, None, None)
+        return ModelResponse(
+            content=content,
+            usage=usage,
+            stream_stats=stream_stats,
+            latency=time.perf_counter() - request_start,
+            endpoint=endpoint,
+        )
+
+    async def _complete(
+        self, client: AsyncOpenAI, request_params: Dict[str, Any], vllm: bool = False
+    ) -> Tuple[str, Any, StreamStats | None]:
+        """Returns:
+        (content, usage, stream stats or None if the response was not streamed)
+        """
+        if self.stream_responses:
+            return await self._stream_completion(client, request_params, vllm)
+        response = await client.chat.completions.create(**request_params)
+        return response.choices[0].message.content, response.usage, None
+
+    async def _stream_completion(
+        self, client: AsyncOpenAI, request_params: Dict[str, Any], vllm: bool = False
+    ) -> Tuple[str, Any, StreamStats]:
+        """Stream a completion and close it once the tool call is complete (the
+        `max_actions_per_turn`-th one if several are allowed).
+
+        Closing the connection makes vLLM abort the request, so the tokens after the
+        tool call are never generated. The thoughts before it are kept in the content.
+        A vLLM server is asked for usage on every chunk (`continuous_usage_stats`,
+        not part of the OpenAI API), so that a cancelled stream still reports its
+        prompt and completion tokens.
+
+        Returns:
+            (content, usage or None if the server sent none before the stream ended,
+            stream stats)
+        """
+        start = time.perf_counter()
+        stats = StreamStats()
+        request_params = {**request_params, "stream_options": {"include_usage": True}}
+        if vllm:
+            # extra_body is merged over the request, so it replaces stream_options
+            request_params["extra_body"] = {
+                **request_params.get("extra_body", {}),
+                "stream_options": {
+                    "include_usage": True,
+                    "continuous_usage_stats": True,
+                },
+            }
+        stream = await client.chat.completions.create(**request_params, stream=True)
+        parts: List[str] = []
+        usage = None
+        # end of the text seen so far, to find the closing tag across chunks
+        tail = ""
+        n_closed = 0
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if stats.time_to_first_token is None:
+                    stats.time_to_first_token = time.perf_counter() - start
+                parts.append(delta)
+                stats.tokens_to_action += 1
+                tail = (tail + delta)[-(len(TOOL_CALL_END) + len(delta)) :]
+                if TOOL_CALL_END in tail:
+                    if stats.time_to_action is None:
+                        stats.time_to_action = time.perf_counter() - start
+                    n_closed += 1
+                    tail = tail[tail.find(TOOL_CALL_END) + len(TOOL_CALL_END) :]
+                    if n_closed >= self.max_actions_per_turn:
+                        stats.cancelled = True
+                        break
+        finally:
+            await stream.close()
+        stats.seconds = time.perf_counter() - start
+        content = "".join(parts)
+        if stats.cancelled:
+            content = truncate_tool_calls(content, n_closed)
+        self.logger.debug(
+            f"Streamed response: first token after {stats.time_to_first_token or 0:.3f}s, "
+            f"action after {stats.time_to_action or stats.seconds:.3f}s and "
+            f"{stats.tokens_to_action} tokens"
+            + (", rest of the generation cancelled" if stats.cancelled else "")
+        )
+        return content, usage, stats
+
+    def _estimate_tokens(self, message: Dict[str, Any]) -> int:
+        """Rough prompt token count of a serialized message."""
+        content = message["content"]
+        if isinstance(content, str):
+            return len(content) // self.CHARS_PER_TOKEN
+        tokens = 0
+        for part in content:
+            if part.get("type") == "image_url":
+                tokens += self.SCREENSHOT_TOKENS
+            else:
+                tokens += len(part.get("text", "")) // self.CHARS_PER_TOKEN
+        return tokens
+
+    def _expected_cached_tokens(
+        self, openai_messages: List[Dict[str, Any]]
+    ) -> Tuple[int, int]:
+        """Estimate how many prompt tokens a prefix cache can serve for this request:
+        the messages it shares with the start of the previous request.
+
+        Returns:
+            (expected_cached_tokens, estimated_prompt_tokens)
+        """
+        tokens = [self._estimate_tokens(msg) for msg in openai_messages]
+        n_common = 0
+        for prev, curr in zip(self._last_request_messages, openai_messages):
+            if prev != curr:
+                break
+            n_common += 1
+        self._last_request_messages = openai_messages
+        return sum(tokens[:n_common]), sum(tokens)
+
+    def _record_prefix_cache(
+        self,
+        expected_cached: int,
+        estimated: int,
+        prompt_tokens: int | None,
+        cached_tokens: int | None,
+    ) -> None:
+        """`prompt_tokens` is None if the server did not report usage, the request
+        then only counts towards the expected side."""
+        stats = self.prefix_cache_stats
+        stats.requests += 1
+        stats.expected_cached_tokens += expected_cached
+        stats.estimated_prompt_tokens += estimated
+        if prompt_tokens is None:
+            return
+        stats.prompt_tokens += prompt_tokens
+        stats.cached_tokens += cached_tokens or 0
+        self.logger.debug(
+            f"Prefix cache: expected {expected_cached}/{estimated} estimated tokens "
+            f"({expected_cached / max(estimated, 1):.0%}), server reported "
+            f"{cached_tokens if cached_tokens is not None else 'n/a'}/{prompt_tokens} cached"
+        )
+
+    @property
+    def _chat_history(self) -> List[LLMMessage]:
+        """All messages of the run, oldest first; released images are `ImageRef`s."""
+        return self._history.messages
+
+    def _release_image(
+        self, image: ImageObj, placeholder: str | None = None
+    ) -> ImageRef:
+        if self._image_store is None:
+            return ImageRef(
+                width=image.image.width,
+                height=image.image.height,
+                placeholder=placeholder,
+            )
+        payload = image.encoded()
+        ref = self._image_store.ref_for(payload, image.image.width, image.image.height)
+        self._pending_writes.append(
+            asyncio.create_task(
+                asyncio.to_thread(self._image_store.put, ref, payload.data)
+            )
+        )
+        return dataclasses.replace(ref, placeholder=placeholder)
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Approximate memory held by the chat history."""
+        live_images = self._history.live_images
+        return {
+            "messages": len(self._history),
+            "live_images": len(live_images),
+            "live_image_bytes": sum(image.nbytes for image in live_images),
+            "released_images": self._history.n_released,
+            "spilled_bytes": self._image_store.bytes_written
+            if self._image_store is not None
+            else 0,
+        }
 
     def remove_screenshot_from_message(self, msg: List[Dict[str, Any]] | Any) -> Any:
-        """Remove the screenshot from the message content."""
+        """Return a copy of the message without its screenshot, the message is not modified."""
         if isinstance(msg.content, list):
             new_content = []
             for c in msg.content:
-                if not isinstance(c, ImageObj):
+                if not isinstance(c, (ImageObj, ImageRef)):
                     new_content.append(c)
+            msg = copy.copy(msg)
             msg.content = new_content
         elif isinstance(msg.content, ImageObj):
             msg = None
@@ -201,6 +593,9 @@ class FaraAgent:
     ) -> List[LLMMessage]:
         """Remove old screenshots from the chat history. Assuming we have not yet added the current screenshot message.
 
+        Rebuilds the whole list; the agent keeps the same view incrementally with
+        `WindowedHistory`.
+
         Note: Original user messages (marked with is_original=True) have their TEXT preserved,
         but their images may be removed if we exceed max_n_images. Boilerplate messages can be
         completely removed.
@@ -228,7 +623,7 @@ class FaraAgent:
                 # Check if the message contains an image. Assumes 1 image per message.
                 has_image = False
                 for c in msg.content:
-                    if isinstance(c, ImageObj):
+                    if isinstance(c, (ImageObj, ImageRef)):
                         has_image = True
                         break
                 if has_image:
@@ -253,36 +648,144 @@ class FaraAgent:
 
         return new_history
 
-    async def _get_scaled_screenshot(self) -> Image.Image:
-        """Get current screenshot and scale it for the model."""
-        screenshot = await self._playwright_controller.get_screenshot(self._page)
-        screenshot = Image.open(io.BytesIO(screenshot))
-        _, scaled_screenshot = self._get_system_message(screenshot)
-        return scaled_screenshot
+    async def _observe(self) -> PageObservation:
+        """Capture screenshot, URL and title of the current page concurrently."""
+        observation = await self._playwright_controller.get_observation(self._page)
+        self.logger.debug(
+            "Observation timings: "
+            + ", ".join(f"{k}={v:.3f}s" for k, v in observation.timings.items())
+        )
+        self._last_observation = observation
+        return observation
+
+    async def _scale_screenshot(self, screenshot_bytes: bytes) -> ImageObj:
+        """Decode a captured screenshot, scale it for the model and encode it in the
+        wire format, all on the image executor.
+
+        If the capture already has the model's size (see `aligned_viewport_size`), the
+        PNG bytes are used as the payload as is and the pixels are never decoded.
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # Image.open only parses the header, pixels are decoded on first access
+        screenshot = Image.open(io.BytesIO(screenshot_bytes))
+        im_size = self._model_image_size(screenshot)
+        if screenshot.size == im_size:
+            scaled = ImageObj.from_encoded(screenshot, screenshot_bytes, "png")
+        else:
+            scaled_image = await loop.run_in_executor(
+                self._image_executor, decode_and_resize, screenshot_bytes, im_size
+            )
+            scaled = ImageObj.from_pil(scaled_image)
+        if not scaled.has_payload(self.screenshot_format, self.screenshot_quality):
+            encodes = [
+                loop.run_in_executor(
+                    self._image_executor,
+                    encode_image,
+                    scaled.image,
+                    self.screenshot_format,
+                    self.screenshot_quality,
+                )
+            ]
+            if scaled.png_nbytes is None and self.screenshot_format != "png":
+                # the PNG at model resolution, only to report what the format saves
+                encodes.append(
+                    loop.run_in_executor(
+                        self._image_executor, encode_image, scaled.image, "png"
+                    )
+                )
+            payload, *png = await asyncio.gather(*encodes)
+            scaled.set_payload(self.screenshot_format, self.screenshot_quality, payload)
+            scaled.png_nbytes = len((png[0] if png else payload).data)
+        self.logger.debug(
+            f"Prepared screenshot off the event loop in {time.perf_counter() - start:.3f}s"
+        )
+        return scaled
+
+    def _save_screenshot(self, screenshot_bytes: bytes) -> None:
+        """Write the captured bytes to screenshot{num_actions}.png on a worker thread."""
+        if not self.save_screenshots:
+            return
+        path = os.path.join(self.downloads_folder, f"screenshot{self._num_actions}.png")
+
+        def _write() -> None:
+            with open(path, "wb") as f:
+                f.write(screenshot_bytes)
+
+        self._pending_writes.append(asyncio.create_task(asyncio.to_thread(_write)))
+
+    async def _flush_screenshot_writes(self) -> None:
+        """Wait for background screenshot writes to finish."""
+        pending, self._pending_writes = self._pending_writes, []
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.logger.error(f"Failed to save screenshot: {result}")
+
+    def _model_image_size(self, screenshot: Image.Image) -> Tuple[int, int]:
+        """Size the model sees the screenshot at, also kept for mapping coordinates.
+
+        Only the width and height are read, so an image whose pixels were not decoded
+        yet (e.g. right after `Image.open`) can be passed.
+        """
+        _, im_size = get_compiled_system_prompt(
+            screenshot,
+            self.MLM_PROCESSOR_IM_CFG,
+            include_input_text_key_args=self.include_input_text_key_args,
+            fn_call_template=self.fn_call_template,
+        )
+        self._mlm_width, self._mlm_height = im_size
+        return im_size
 
     def _get_system_message(
         self, screenshot: ImageObj | Image.Image
     ) -> Tuple[List[SystemMessage], Image.Image]:
-        system_prompt_info = get_computer_use_system_prompt(
+        system_messages, im_size = get_compiled_system_prompt(
             screenshot,
             self.MLM_PROCESSOR_IM_CFG,
             include_input_text_key_args=self.include_input_text_key_args,
             fn_call_template=self.fn_call_template,
         )
-        self._mlm_width, self._mlm_height = system_prompt_info["im_size"]
-        scaled_screenshot = screenshot.resize((self._mlm_width, self._mlm_height))
+        self._mlm_width, self._mlm_height = im_size
+        system_messages = list(system_messages)
+        if self.max_actions_per_turn > 1:
+            # the compiled messages are shared, extend a copy of the last one
+            hint = self.MULTI_ACTION_HINT.format(max_actions=self.max_actions_per_turn)
+            system_messages[-1] = SystemMessage(
+                content=f"{system_messages[-1].content}\n\n{hint}"
+            )
+        if screenshot.size == im_size:
+            scaled_screenshot = screenshot
+        else:
+            scaled_screenshot = screenshot.resize((self._mlm_width, self._mlm_height))
 
-        system_message = []
-        for msg in system_prompt_info["conversation"]:
-            tmp_content = ""
-            for content in msg["content"]:
-                tmp_content += content["text"]
+        return system_messages, scaled_screenshot
 
-            system_message.append(SystemMessage(content=tmp_content))
+    def _format_tool_call(self, thoughts: str, action: Dict[str, Any]) -> str:
+        """Response text of a single tool call, to record a batched action as a step."""
+        return f"{thoughts}\n{TOOL_CALL_START}\n{json.dumps(action)}\n{TOOL_CALL_END}"
 
-        return system_message, scaled_screenshot
+    def _parse_thoughts_and_actions(
+        self, message: str
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Parse the thoughts and up to `max_actions_per_turn` tool calls, in order."""
+        thoughts, action = self._parse_thoughts_and_action(message)
+        actions = [action]
+        if self.max_actions_per_turn > 1:
+            blocks = message.split(TOOL_CALL_START)[2 : self.max_actions_per_turn + 1]
+            for block in blocks:
+                _, action = self._parse_thoughts_and_action(TOOL_CALL_START + block)
+                actions.append(action)
+        return thoughts, actions
 
     def _parse_thoughts_and_action(self, message: str) -> Tuple[str, Dict[str, Any]]:
+        if self._tool_call_parser is not None:
+            try:
+                return self._tool_call_parser.parse(message)
+            except ValueError:
+                self.logger.error(
+                    f"Error parsing thoughts and action: {message}", exc_info=True
+                )
+                raise
         try:
             tmp = message.split("<tool_call>\n")
             thoughts = tmp[0].strip()
@@ -336,20 +839,176 @@ class FaraAgent:
         # Ensure page is ready after initialization
         assert self._page is not None, "Page should be initialized"
 
-        # Get initial screenshot and add user message with image to chat history
-        scaled_screenshot = await self._get_scaled_screenshot()
+        self._run_start = time.monotonic()
+        if self._endpoint_pool is not None:
+            self._hedges_at_start = self._endpoint_pool.hedges
+        if self.loop_lag_monitor is not None:
+            self.loop_lag_monitor.start()
+        try:
+            return await self._run(user_message)
+        finally:
+            await self._flush_screenshot_writes()
+            stats = self.prefix_cache_stats
+            self.logger.info(
+                f"Prefix cache over {stats.requests} requests ({self.history_mode} history): "
+                f"expected {stats.expected_ratio:.0%}, actual {stats.actual_ratio:.0%} "
+                f"({stats.cached_tokens}/{stats.prompt_tokens} prompt tokens)"
+            )
+            if self.loop_lag_monitor is not None:
+                await self.loop_lag_monitor.stop()
+                self.logger.info(f"Event {self.loop_lag_monitor.summary()}")
+            if self._endpoint_pool is not None:
+                self.logger.info(
+                    f"Endpoints ({self._endpoint_pool.hedges} hedged requests): "
+                    f"{self._endpoint_pool.stats()}"
+                )
+
+    async def _screenshot_hash(self, screenshot_bytes: bytes) -> int:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._image_executor, screenshot_dhash, screenshot_bytes
+        )
+
+    async def _check_progress(
+        self, arguments: Dict[str, Any], screenshot_bytes: bytes
+    ) -> bool:
+        """Record an executed action with the no-progress detector.
 
-        if self.save_screenshots:
-            await self._playwright_controller.get_screenshot(
-                self._page,
-                path=os.path.join(
-                    self.downloads_folder, f"screenshot{self._num_actions}.png"
-                ),
+        Returns:
+            True if the run should stop, `abort_reason` is then set.
+        """
+        if self._progress_monitor is None:
+            return False
+        reason = self._progress_monitor.record(
+            arguments,
+            await self._screenshot_hash(screenshot_bytes),
+            self._last_observation.url,
+        )
+        if reason is None:
+            return False
+        if (
+            self.no_progress_policy == "hint"
+            and self._no_progress_hints < self.MAX_NO_PROGRESS_HINTS
+        ):
+            self._no_progress_hints += 1
+            self._pending_hint = self.NO_PROGRESS_HINT
+            self._progress_monitor.reset()
+            self.logger.info(f"No progress ({reason}), adding a recovery hint")
+            return False
+        self.abort_reason = f"no_progress: {reason}"
+        self.logger.info(f"Stopping early, no progress: {reason}")
+        return True
+
+    def _exhausted_budget(self) -> str | None:
+        """Return which opt-in budget is exhausted, if any; max_rounds is checked
+        separately since reaching it is not an abort."""
+        if self.max_seconds is not None:
+            elapsed = time.monotonic() - self._run_start
+            if elapsed >= self.max_seconds:
+                return f"wall-clock budget of {self.max_seconds}s exhausted after {elapsed:.1f}s"
+        if (
+            self.max_prompt_tokens is not None
+            and self.usage_stats.prompt_tokens >= self.max_prompt_tokens
+        ):
+            return f"prompt token budget of {self.max_prompt_tokens} exhausted ({self.usage_stats.prompt_tokens} used)"
+        if (
+            self.max_completion_tokens is not None
+            and self.usage_stats.completion_tokens >= self.max_completion_tokens
+        ):
+            return f"completion token budget of {self.max_completion_tokens} exhausted ({self.usage_stats.completion_tokens} used)"
+        return None
+
+    def _record_model_call(self, response: ModelResponse) -> None:
+        record = ModelCallRecord(
+            model_call=len(self.model_call_records) + 1,
+            step=self._num_actions + 1,
+            prompt_tokens=response.usage.get("prompt_tokens", 0),
+            completion_tokens=response.usage.get("completion_tokens", 0),
+            cached_tokens=response.usage.get("cached_tokens", 0),
+            latency=response.latency,
+            estimated=response.usage.get("estimated", False),
+            endpoint=response.endpoint,
+            image_bytes=self.encode_stats.payload_bytes,
+            image_bytes_saved=self.encode_stats.saved_bytes,
+        )
+        if response.stream_stats is not None:
+            record.time_to_first_token = response.stream_stats.time_to_first_token
+            record.time_to_action = response.stream_stats.time_to_action
+            record.tokens_to_action = response.stream_stats.tokens_to_action
+            record.cancelled = response.stream_stats.cancelled
+        self.model_call_records.append(record)
+        self.usage_stats.add(record)
+        # a dataclass event in web_surfer.log
+        self.logger.debug(record)
+
+    def metrics(self) -> Dict[str, float]:
+        """Token usage, model latency and throughput of the last run."""
+        stats = self.usage_stats
+        wall_seconds = (
+            time.monotonic() - self._run_start if self._run_start is not None else 0.0
+        )
+        metrics = {
+            "steps": self._num_actions,
+            "model_calls": stats.model_calls,
+            "prompt_tokens": stats.prompt_tokens,
+            "completion_tokens": stats.completion_tokens,
+            "cached_tokens": stats.cached_tokens,
+            "model_seconds": round(stats.model_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "completion_tokens_per_second": round(
+                stats.completion_tokens_per_second, 2
+            ),
+        }
+        if stats.image_bytes:
+            metrics["image_bytes"] = stats.image_bytes
+            metrics["image_bytes_saved"] = stats.image_bytes_saved
+        if stats.estimated_calls:
+            metrics["estimated_usage_calls"] = stats.estimated_calls
+        if stats.streamed_calls:
+            metrics["cancelled_streams"] = stats.cancelled_calls
+            metrics["mean_tokens_to_action"] = round(
+                stats.tokens_to_action / stats.streamed_calls, 1
+            )
+            if stats.actions_streamed:
+                metrics["mean_time_to_action"] = round(
+                    stats.time_to_action_seconds / stats.actions_streamed, 3
+                )
+        if self.time_to_first_observation is not None:
+            metrics["time_to_first_observation"] = round(
+                self.time_to_first_observation, 3
             )
+        if self._endpoint_pool is not None:
+            metrics["hedged_requests"] = (
+                self._endpoint_pool.hedges - self._hedges_at_start
+            )
+        return metrics
+
+    def _best_answer_so_far(self) -> str:
+        """Answer of a run stopped before the model terminated it: the memorized facts."""
+        if self._facts:
+            return "\n".join(self._facts)
+        return "<no_answer>"
+
+    async def _run(self, user_message: str) -> Tuple:
+        self.abort_reason = None
+        # Get initial screenshot (captured once, also used for the saved file)
+        # and add user message with image to chat history
+        observation = await self._observe()
+        if self.time_to_first_observation is None:
+            self.time_to_first_observation = time.monotonic() - self._init_start
+            self.logger.debug(
+                f"First observation {self.time_to_first_observation:.3f}s after initialize()"
+            )
+        self._save_screenshot(observation.screenshot)
+        if self._progress_monitor is not None:
+            self._progress_monitor.start(
+                await self._screenshot_hash(observation.screenshot), observation.url
+            )
+        scaled_screenshot = await self._scale_screenshot(observation.screenshot)
+        current_url = observation.url
 
-        self._chat_history.append(
+        self._history.append(
             UserMessage(
-                content=[ImageObj.from_pil(scaled_screenshot), user_message],
+                content=[scaled_screenshot, user_message],
                 is_original=True,
             )
         )
@@ -358,8 +1017,18 @@ class FaraAgent:
         all_observations = []
         final_answer = "<no_answer>"
         is_stop_action = False
-        for i in range(self.max_rounds):
+        # steps are actions, batched actions count individually against max_rounds
+        n_steps = 0
+        i = 0
+        while n_steps < self.max_rounds:
+            # reaching max_rounds ends the run without an answer, as it always has
+            exhausted = self._exhausted_budget()
+            if exhausted is not None:
+                self.abort_reason = f"budget: {exhausted}"
+                self.logger.info(f"Stopping, {exhausted}")
+                break
             is_first_round = i == 0
+            i += 1
             if not self.browser_manager._captcha_event.is_set():
                 self.logger.info("Waiting 60s for captcha to finish...")
                 captcha_solved = await self.wait_for_captcha_with_timeout(60)
@@ -370,69 +1039,136 @@ class FaraAgent:
                     raise RuntimeError(
                         "Captcha timed out, unable to proceed with web surfing."
                     )
+                if not is_first_round:
+                    # the page changed while the captcha was solved, capture again
+                    scaled_screenshot = None
+                    current_url = None
 
-            function_call, raw_response = await self.generate_model_call(
-                is_first_round, scaled_screenshot if is_first_round else None
+            function_calls, raw_response = await self.generate_model_call(
+                is_first_round, scaled_screenshot, current_url
             )
             assert isinstance(raw_response, str)
-            all_actions.append(raw_response)
-            thoughts, action_dict = self._parse_thoughts_and_action(raw_response)
-            action_args = action_dict.get("arguments", {})
-            action = action_args["action"]
-            self.logger.debug(
-                f"\nThought #{i+1}: {thoughts}\nAction #{i+1}: executing tool '{action}' with arguments {json.dumps(action_args)}"
-            )
-            print(
-                f"\nThought #{i+1}: {thoughts}\nAction #{i+1}: executing tool '{action}' with arguments {json.dumps(action_args)}"
-            )
-            (
-                is_stop_action,
-                new_screenshot,
-                action_description,
-            ) = await self.execute_action(function_call)
-            all_observations.append(action_description)
-            self.logger.debug(f"Observation#{i+1}: {action_description}")
-            print(f"Observation#{i+1}: {action_description}")
+            thoughts = function_calls[0].arguments["thoughts"]
+            n_batch = min(len(function_calls), self.max_rounds - n_steps)
+            n_executed = 0
+            for function_call in function_calls[:n_batch]:
+                n_steps += 1
+                # as parsed, before execute_action rescales the coordinates
+                action_args = {
+                    k: v for k, v in function_call.arguments.items() if k != "thoughts"
+                }
+                if len(function_calls) == 1:
+                    all_actions.append(raw_response)
+                else:
+                    action_dict = {"name": function_call.name, "arguments": action_args}
+                    all_actions.append(self._format_tool_call(thoughts, action_dict))
+                action = action_args["action"]
+                self.logger.debug(
+                    f"\nThought #{n_steps}: {thoughts}\nAction #{n_steps}: executing tool '{action}' with arguments {json.dumps(action_args)}"
+                )
+                print(
+                    f"\nThought #{n_steps}: {thoughts}\nAction #{n_steps}: executing tool '{action}' with arguments {json.dumps(action_args)}"
+                )
+                page_before = self._page
+                url_before = self._last_observation.url
+                (
+                    is_stop_action,
+                    new_screenshot,
+                    action_description,
+                ) = await self.execute_action([function_call])
+                n_executed += 1
+                all_observations.append(action_description)
+                self.logger.debug(f"Observation#{n_steps}: {action_description}")
+                print(f"Observation#{n_steps}: {action_description}")
+                if is_stop_action:
+                    break
+                if await self._check_progress(action_args, new_screenshot):
+                    break
+                if n_executed < n_batch and (
+                    self._page is not page_before
+                    or self._last_observation.url != url_before
+                ):
+                    # later actions were planned on the previous page
+                    self.logger.debug(
+                        f"Page changed, skipping {n_batch - n_executed} batched actions"
+                    )
+                    break
+            if n_executed < len(function_calls):
+                # only keep the executed tool calls in the history
+                last_message = self._chat_history[-1]
+                last_message.content = truncate_tool_calls(
+                    last_message.content, n_executed
+                )
             if is_stop_action:
                 final_answer = thoughts
                 break
+            if self.abort_reason is not None:
+                break
+            # the post-action capture is the observation for the next round
+            scaled_screenshot = await self._scale_screenshot(new_screenshot)
+            current_url = self._last_observation.url
+        if self.abort_reason is not None:
+            final_answer = self._best_answer_so_far()
         return final_answer, all_actions, all_observations
 
     async def generate_model_call(
-        self, is_first_round: bool, first_screenshot: Image.Image | None = None
+        self,
+        is_first_round: bool,
+        scaled_screenshot: ImageObj | None = None,
+        current_url: str | None = None,
     ) -> Tuple[List[FunctionCall], str]:
-        history = self.maybe_remove_old_screenshots(self._chat_history)
+        """Query the model for the next action.
 
-        screenshot_for_system = first_screenshot
+        `scaled_screenshot` and `current_url` describe the current observation; on the
+        first round the screenshot is the image already in the original user message.
+        If they are not given on later rounds, the page is observed again.
+        """
+        if scaled_screenshot is None:
+            observation = await self._observe()
+            scaled_screenshot = await self._scale_screenshot(observation.screenshot)
+            current_url = observation.url
+        screenshot_for_system = scaled_screenshot.image
         if not is_first_round:
-            # Get screenshot and add new user message for subsequent rounds
-            scaled_screenshot = await self._get_scaled_screenshot()
-            screenshot_for_system = scaled_screenshot
-
+            # Add new user message with the screenshot for subsequent rounds
             text_prompt = self.USER_MESSAGE
-            curr_url = await self._playwright_controller.get_page_url(self._page)
+            curr_url = current_url
+            if curr_url is None:
+                curr_url = await self._playwright_controller.get_page_url(self._page)
             trimmed_url = get_trimmed_url(curr_url, max_len=self.max_url_chars)
             text_prompt = f"Current URL: {trimmed_url}\n" + text_prompt
+            if self._pending_hint is not None:
+                text_prompt += "\n" + self._pending_hint
+                self._pending_hint = None
 
-            curr_message = UserMessage(
-                content=[ImageObj.from_pil(scaled_screenshot), text_prompt]
-            )
-            self._chat_history.append(curr_message)
-            history.append(curr_message)
+            curr_message = UserMessage(content=[scaled_screenshot, text_prompt])
+            self._history.append(curr_message)
+        history = self._history.view()
 
         # Generate system message using the screenshot
         system_message, _ = self._get_system_message(screenshot_for_system)
         history = system_message + history
+        extra_create_args = {"temperature": 0}
+        if self.guided_decoding:
+            extra_create_args["extra_body"] = {
+                "guided_regex": tool_call_regex(
+                    self.include_input_text_key_args, self.max_actions_per_turn
+                )
+            }
         response = await self._make_model_call(
-            history, extra_create_args={"temperature": 0}
+            history, extra_create_args=extra_create_args
         )
         message = response.content
-
-        self._chat_history.append(AssistantMessage(content=message))
-        thoughts, action = self._parse_thoughts_and_action(message)
-        action["arguments"]["thoughts"] = thoughts
-
-        function_call = [FunctionCall(id="dummy", **action)]
+        self._record_model_call(response)
+        if self.max_actions_per_turn > 1:
+            message = truncate_tool_calls(message, self.max_actions_per_turn)
+
+        self._history.append(AssistantMessage(content=message))
+        self.logger.debug(f"Chat history memory footprint: {self.memory_footprint()}")
+        thoughts, actions = self._parse_thoughts_and_actions(message)
+        function_call = []
+        for action in actions:
+            action["arguments"]["thoughts"] = thoughts
+            function_call.append(FunctionCall(id="dummy", **action))
         return function_call, message
 
     async def execute_action(
@@ -577,22 +1313,21 @@ class FaraAgent:
         else:
             raise ValueError(f"Unknown tool: {args['action']}")
 
+        settle_start = time.perf_counter()
         await self._playwright_controller.wait_for_load_state(self._page)
-        await self._playwright_controller.sleep(self._page, 3)
+        await self.settle_policy.settle(
+            self._playwright_controller, self._page, args["action"]
+        )
+        settle_seconds = time.perf_counter() - settle_start
+        self.logger.debug(
+            f"Settled after '{args['action']}' in {settle_seconds:.2f}s ({type(self.settle_policy).__name__})"
+        )
 
-        # Get new screenshot after action
+        # Get new screenshot after action, saved from the same capture
         self._num_actions += 1
-        if self.save_screenshots:
-            new_screenshot = await self._playwright_controller.get_screenshot(
-                self._page,
-                path=os.path.join(
-                    self.downloads_folder, f"screenshot{self._num_actions}.png"
-                ),
-            )
-        else:
-            new_screenshot = await self._playwright_controller.get_screenshot(
-                self._page
-            )
+        observation = await self._observe()
+        new_screenshot = observation.screenshot
+        self._save_screenshot(new_screenshot)
         return is_stop_action, new_screenshot, action_description
 
     async def close(self) -> None:
@@ -600,6 +1335,9 @@ class FaraAgent:
         Close the browser and the page.
         Should be called when the agent is no longer needed.
         """
+        await self._flush_screenshot_writes()
+        if self._owns_image_executor:
+            self._image_executor.shutdown(wait=False)
         if self._page is not None:
             self._page = None
         await self.browser_manager.close()
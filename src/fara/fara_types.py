@@ -1,5 +1,6 @@
 import io
 import base64
+import time
 from dataclasses import dataclass, field
 from typing import Any, List, Tuple, Dict
 from PIL import Image
@@ -38,33 +39,303 @@ class AssistantMessage(LLMMessage):
         self.source = source
 
 
+@dataclass(frozen=True)
+class ImagePayload:
+    """Encoded image bytes together with the data URL sent to the model"""
+
+    data: bytes
+    mime_type: str
+    data_url: str
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mime_type: str) -> "ImagePayload":
+        base64_image = base64.b64encode(data).decode("utf-8")
+        return cls(
+            data=data,
+            mime_type=mime_type,
+            data_url=f"data:{mime_type};base64,{base64_image}",
+        )
+
+
+# model payload formats: name -> (PIL format, mime type)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+def encode_image(
+    image: Image.Image, image_format: str = "png", quality: int | None = None
+) -> ImagePayload:
+    """Encode a PIL image for the model, see IMAGE_FORMATS"""
+    pil_format, mime_type = IMAGE_FORMATS[image_format]
+    save_kwargs: Dict[str, Any] = {}
+    if pil_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    if quality is not None and pil_format != "PNG":
+        save_kwargs["quality"] = quality
+    buffered = io.BytesIO()
+    image.save(buffered, format=pil_format, **save_kwargs)
+    return ImagePayload.from_bytes(buffered.getvalue(), mime_type)
+
+
+def decode_and_resize(data: bytes, size: Tuple[int, int]) -> Image.Image:
+    """Decode an encoded image and resize it, fully loading the result"""
+    image = Image.open(io.BytesIO(data))
+    if image.size == size:
+        image.load()
+        return image
+    return image.resize(size)
+
+
+@dataclass
+class EncodeStats:
+    """Image encoding work and payload sizes, e.g. for one model request"""
+
+    calls: int = 0
+    seconds: float = 0.0
+    images: int = 0
+    payload_bytes: int = 0
+    # size of the same images as PNG at the resolution sent, where known, and what
+    # the wire format saved on them compared to sending that PNG
+    png_bytes: int = 0
+    saved_bytes: int = 0
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.images = 0
+        self.payload_bytes = 0
+        self.png_bytes = 0
+        self.saved_bytes = 0
+
+
+@dataclass
+class PrefixCacheStats:
+    """Prompt tokens served from the server's prefix cache, expected vs reported
+
+    Expected counts are estimates from the request layout (see
+    `FaraAgent._estimate_tokens`), actual ones come from the usage returned by the
+    server, when it reports `prompt_tokens_details.cached_tokens`.
+    """
+
+    requests: int = 0
+    estimated_prompt_tokens: int = 0
+    expected_cached_tokens: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def expected_ratio(self) -> float:
+        if not self.estimated_prompt_tokens:
+            return 0.0
+        return self.expected_cached_tokens / self.estimated_prompt_tokens
+
+    @property
+    def actual_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
 @dataclass
 class ImageObj:
-    """Image wrapper for handling screenshots and images"""
+    """Image wrapper for handling screenshots and images
+
+    Encoded payloads are computed on first use per (format, quality) and reused
+    afterwards, so the wrapped image must not be modified in place once sent.
+    `png_nbytes` is the size of the image as PNG at its own resolution, if known,
+    which the payload size is compared against.
+    """
 
     image: Image.Image
+    png_nbytes: int | None = None
+    _payloads: Dict[Tuple[str, int | None], ImagePayload] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    @classmethod
+    def from_pil(cls, image: Image.Image, png_nbytes: int | None = None) -> "ImageObj":
+        return cls(image=image, png_nbytes=png_nbytes)
 
     @classmethod
-    def from_pil(cls, image: Image.Image) -> "ImageObj":
-        return cls(image=image)
+    def from_encoded(
+        cls, image: Image.Image, data: bytes, image_format: str = "png"
+    ) -> "ImageObj":
+        """Wrap an image whose encoded bytes are already known, e.g. a screenshot
+        capture, so that sending it in that format needs no re-encoding."""
+        obj = cls(image=image, png_nbytes=len(data) if image_format == "png" else None)
+        obj._payloads[(image_format, None)] = ImagePayload.from_bytes(
+            data, IMAGE_FORMATS[image_format][1]
+        )
+        return obj
+
+    def payload(
+        self,
+        image_format: str = "png",
+        quality: int | None = None,
+        stats: EncodeStats | None = None,
+    ) -> ImagePayload:
+        """Return the encoded image, encoding it only on the first call per format"""
+        key = (image_format, quality)
+        if key not in self._payloads:
+            start = time.perf_counter()
+            self._payloads[key] = encode_image(self.image, image_format, quality)
+            if stats is not None:
+                stats.calls += 1
+                stats.seconds += time.perf_counter() - start
+        return self._payloads[key]
+
+    def has_payload(
+        self, image_format: str = "png", quality: int | None = None
+    ) -> bool:
+        return (image_format, quality) in self._payloads
+
+    def set_payload(
+        self, image_format: str, quality: int | None, payload: ImagePayload
+    ) -> None:
+        """Store a payload encoded elsewhere, e.g. on an executor with `encode_image`"""
+        self._payloads[(image_format, quality)] = payload
+
+    def encoded(self) -> ImagePayload:
+        """Return an already cached payload in any format, encoding PNG only if none"""
+        if self._payloads:
+            return next(iter(self._payloads.values()))
+        return self.payload()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held: decoded pixels plus cached payloads"""
+        pixels = self.image.width * self.image.height * len(self.image.getbands())
+        return pixels + sum(len(p.data) for p in self._payloads.values())
 
     def to_base64(self) -> str:
         """Convert PIL image to base64 string"""
-        buffered = io.BytesIO()
-        self.image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode("utf-8")
+        return self.payload().data_url.split(",", 1)[1]
 
     def resize(self, size: Tuple[int, int]) -> Image.Image:
         """Resize the image"""
         return self.image.resize(size)
 
 
+@dataclass(frozen=True)
+class ImageRef:
+    """Lightweight handle left in the chat history in place of a released image
+
+    Images older than the agent's image window are never sent to the model again.
+    `path` points to a copy in an `ImageStore` if the history spills to disk.
+    If `placeholder` is set it is sent as text where the image used to be.
+    """
+
+    width: int
+    height: int
+    digest: str | None = None
+    path: str | None = None
+    placeholder: str | None = None
+
+    def load(self) -> Image.Image:
+        if self.path is None:
+            raise ValueError("Image was released without being stored")
+        with Image.open(self.path) as image:
+            image.load()
+            return image
+
+
+@dataclass
+class StreamStats:
+    """Timings of a streamed model response, in seconds from the request start
+
+    `tokens_to_action` counts the streamed content chunks up to the end of the tool
+    call (one token per chunk with vLLM); `cancelled` is set when the generation was
+    stopped there instead of running to the end.
+    """
+
+    time_to_first_token: float | None = None
+    time_to_action: float | None = None
+    seconds: float = 0.0
+    tokens_to_action: int = 0
+    cancelled: bool = False
+
+
 @dataclass
 class ModelResponse:
     """Response from model call"""
 
     content: str
     usage: Dict[str, Any] = field(default_factory=dict)
+    stream_stats: StreamStats | None = None
+    # seconds from sending the request to the end of the response
+    latency: float = 0.0
+    # base_url of the endpoint that answered, when requests go through an EndpointPool
+    endpoint: str | None = None
+
+
+@dataclass
+class ModelCallRecord:
+    """Token usage, latency and image payload of one model call, logged as an event
+    per step"""
+
+    model_call: int
+    step: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    latency: float
+    time_to_first_token: float | None = None
+    # streamed calls only, see StreamStats
+    time_to_action: float | None = None
+    tokens_to_action: int | None = None
+    cancelled: bool = False
+    endpoint: str | None = None
+    # bytes of the images sent and saved by the wire format, see EncodeStats
+    image_bytes: int = 0
+    image_bytes_saved: int = 0
+    # prompt tokens estimated from the request, the server reported no usage
+    estimated: bool = False
+    source: str = "FaraAgent"
+
+
+@dataclass
+class UsageStats:
+    """Token usage and model latency summed over a run"""
+
+    model_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    model_seconds: float = 0.0
+    # calls whose prompt tokens are estimates, see ModelCallRecord
+    estimated_calls: int = 0
+    # streamed calls, those cancelled after the tool call, and their time to action
+    streamed_calls: int = 0
+    cancelled_calls: int = 0
+    tokens_to_action: int = 0
+    actions_streamed: int = 0
+    time_to_action_seconds: float = 0.0
+    image_bytes: int = 0
+    image_bytes_saved: int = 0
+
+    def add(self, record: ModelCallRecord) -> None:
+        self.model_calls += 1
+        self.estimated_calls += int(record.estimated)
+        self.image_bytes += record.image_bytes
+        self.image_bytes_saved += record.image_bytes_saved
+        if record.tokens_to_action is not None:
+            self.streamed_calls += 1
+            self.cancelled_calls += int(record.cancelled)
+            self.tokens_to_action += record.tokens_to_action
+        if record.time_to_action is not None:
+            self.actions_streamed += 1
+            self.time_to_action_seconds += record.time_to_action
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cached_tokens += record.cached_tokens
+        self.model_seconds += record.latency
+
+    @property
+    def completion_tokens_per_second(self) -> float:
+        if not self.model_seconds:
+            return 0.0
+        return self.completion_tokens / self.model_seconds
 
 
 @dataclass
@@ -76,8 +347,17 @@ class FunctionCall:
     arguments: Dict[str, Any]
 
 
-def message_to_openai_format(message: LLMMessage) -> Dict[str, Any]:
-    """Convert our LLMMessage to OpenAI API format"""
+def message_to_openai_format(
+    message: LLMMessage,
+    encode_stats: EncodeStats | None = None,
+    image_format: str = "png",
+    image_quality: int | None = None,
+) -> Dict[str, Any]:
+    """Convert our LLMMessage to OpenAI API format
+
+    Images are encoded once per format and cached on the ImageObj; `encode_stats`,
+    if given, records the encodes done during this conversion and the payload sizes.
+    """
     role = (
         "system"
         if isinstance(message, SystemMessage)
@@ -91,14 +371,24 @@ def message_to_openai_format(message: LLMMessage) -> Dict[str, Any]:
         content_parts = []
         for item in message.content:
             if isinstance(item, ImageObj):
-                # Convert image to base64 data URL
-                base64_image = item.to_base64()
+                # Reuse the cached base64 data URL
+                payload = item.payload(image_format, image_quality, encode_stats)
+                if encode_stats is not None:
+                    encode_stats.images += 1
+                    encode_stats.payload_bytes += len(payload.data)
+                    if item.png_nbytes is not None:
+                        encode_stats.png_bytes += item.png_nbytes
+                        encode_stats.saved_bytes += item.png_nbytes - len(payload.data)
                 content_parts.append(
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/png;base64,{base64_image}"},
+                        "image_url": {"url": payload.data_url},
                     }
                 )
+            elif isinstance(item, ImageRef):
+                # Released image outside the image window
+                if item.placeholder is not None:
+                    content_parts.append({"type": "text", "text": item.placeholder})
             elif isinstance(item, str):
                 content_parts.append({"type": "text", "text": item})
             elif isinstance(item, dict):
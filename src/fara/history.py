@@ -0,0 +1,118 @@
+import copy
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+from .fara_types import ImageObj, ImageRef, LLMMessage, UserMessage
+
+# (image, placeholder) -> handle left in the stored message
+ReleaseFn = Callable[[ImageObj, str | None], ImageRef]
+
+
+def _release_in_place(image: ImageObj, placeholder: str | None) -> ImageRef:
+    return ImageRef(
+        width=image.image.width, height=image.image.height, placeholder=placeholder
+    )
+
+
+class WindowedHistory:
+    """Chat history that keeps at most `max_n_images` screenshots in the request view.
+
+    Appending a turn is O(1): screenshot turns occupy slots in a ring, and the turn
+    whose slot is evicted leaves the view (a text-only copy is kept for the task
+    message), so the view is maintained incrementally instead of being rebuilt every
+    step. Stored messages are never stripped for the view; the evicted image is only
+    replaced by the handle returned by `release`, since it is never sent again.
+
+    In "sliding" mode (the behavior of `FaraAgent.maybe_remove_old_screenshots`) one
+    turn leaves per step. In "prefix_stable" mode turns are never dropped: at least
+    `evict_block` images are released at once and `placeholder` is sent in their
+    place, so the request prefix only changes once per block.
+    """
+
+    MODES = ["sliding", "prefix_stable"]
+
+    def __init__(
+        self,
+        max_n_images: int,
+        mode: str = "sliding",
+        evict_block: int = 1,
+        placeholder: str | None = None,
+        release: ReleaseFn | None = None,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode: {mode}. Available options: {self.MODES}")
+        self.max_n_images = max_n_images
+        self.mode = mode
+        self.evict_block = max(1, evict_block)
+        self.placeholder = placeholder
+        self.release = release or _release_in_place
+        self.messages: List[LLMMessage] = []
+        self.n_released = 0
+        # sequence number -> message as sent, in order
+        self._view: Dict[int, LLMMessage] = {}
+        # screenshot slots, oldest first: (sequence number, image)
+        self._image_slots: Deque[Tuple[int, ImageObj]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @property
+    def live_images(self) -> List[ImageObj]:
+        return [image for _, image in self._image_slots]
+
+    def append(self, message: LLMMessage) -> None:
+        seq = len(self.messages)
+        self.messages.append(message)
+        self._view[seq] = message
+        if isinstance(message.content, ImageObj):
+            self._image_slots.append((seq, message.content))
+        elif isinstance(message.content, list):
+            for item in message.content:
+                if isinstance(item, ImageObj):
+                    # one screenshot per turn
+                    self._image_slots.append((seq, item))
+                    break
+        self._evict()
+
+    def view(self) -> List[LLMMessage]:
+        """Messages to send, oldest first. Shares the stored message objects."""
+        return list(self._view.values())
+
+    def _evict(self) -> None:
+        if self.max_n_images <= 0:
+            return
+        n_evict = len(self._image_slots) - self.max_n_images
+        if n_evict <= 0:
+            return
+        if self.mode == "prefix_stable":
+            # always keep the newest image, it is the current observation
+            n_evict = min(max(n_evict, self.evict_block), len(self._image_slots) - 1)
+        for _ in range(n_evict):
+            seq, image = self._image_slots.popleft()
+            message = self.messages[seq]
+            if self.mode == "sliding":
+                self._drop_from_view(seq, message)
+            self._release(message, image)
+
+    def _drop_from_view(self, seq: int, message: LLMMessage) -> None:
+        # the task message keeps its text, other screenshot turns leave entirely
+        is_original = isinstance(message, UserMessage) and message.is_original
+        if (is_original or seq == 0) and isinstance(message.content, list):
+            text_only = copy.copy(message)
+            text_only.content = [
+                c for c in message.content if not isinstance(c, (ImageObj, ImageRef))
+            ]
+            self._view[seq] = text_only
+        else:
+            del self._view[seq]
+
+    def _release(self, message: LLMMessage, image: ImageObj) -> None:
+        placeholder = self.placeholder if self.mode == "prefix_stable" else None
+        if message.content is image:
+            message.content = [self.release(image, placeholder)]
+        else:
+            for i, item in enumerate(message.content):
+                if item is image:
+                    message.content[i] = self.release(image, placeholder)
+                    break
+        self.n_released += 1
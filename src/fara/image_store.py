@@ -0,0 +1,49 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from .fara_types import IMAGE_FORMATS, ImagePayload, ImageRef
+
+_EXTENSIONS = {mime_type: name for name, (_, mime_type) in IMAGE_FORMATS.items()}
+
+
+class ImageStore:
+    """Content-addressed on-disk store for screenshots released from the chat history.
+
+    Files are named after the SHA-256 of their encoded bytes, so identical screenshots
+    (e.g. an unchanged page) are stored once. `put` may run on several threads.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.n_files = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def ref_for(self, payload: ImagePayload, width: int, height: int) -> ImageRef:
+        """Build the handle of a payload without touching the disk."""
+        digest = hashlib.sha256(payload.data).hexdigest()
+        ext = _EXTENSIONS.get(payload.mime_type, "bin")
+        path = os.path.join(self.root, digest[:2], f"{digest}.{ext}")
+        return ImageRef(width=width, height=height, digest=digest, path=path)
+
+    def put(self, ref: ImageRef, data: bytes) -> None:
+        """Write the bytes of `ref` unless they are already stored. Blocking."""
+        if os.path.exists(ref.path):
+            return
+        directory = os.path.dirname(ref.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # atomic, concurrent writers of the same digest write the same bytes
+            os.replace(tmp_path, ref.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self.n_files += 1
+            self.bytes_written += len(data)
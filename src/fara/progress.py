@@ -0,0 +1,103 @@
+import io
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Tuple
+
+from PIL import Image
+
+# actions that are not expected to change the page
+PASSIVE_ACTIONS = {"pause_and_memorize_fact", "wait", "sleep"}
+
+
+def screenshot_dhash(data: bytes, hash_size: int = 8) -> int:
+    """Difference hash of an encoded screenshot: one bit per horizontally adjacent
+    pixel pair of a (hash_size + 1) x hash_size grayscale thumbnail."""
+    with Image.open(io.BytesIO(data)) as image:
+        thumbnail = image.convert("L").resize((hash_size + 1, hash_size))
+    pixels = thumbnail.load()
+    value = 0
+    for y in range(hash_size):
+        for x in range(hash_size):
+            value = (value << 1) | (pixels[x, y] > pixels[x + 1, y])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def action_key(arguments: Dict[str, Any]) -> str:
+    """Identity of an action: its arguments without the thoughts."""
+    return json.dumps(
+        {k: v for k, v in arguments.items() if k != "thoughts"}, sort_keys=True
+    )
+
+
+@dataclass
+class _Step:
+    screen_hash: int
+    url: str
+    action: str
+    changed: bool
+
+
+class ProgressMonitor:
+    """Detects trajectories that stopped making progress.
+
+    Each step records the page state before the action (screenshot dHash and URL),
+    the action and whether the page changed. Two patterns are reported, over the
+    last `window` steps:
+
+    - the same action taken `max_repeats` times from the same page state, which
+      covers both repeated no-ops and cycles such as scrolling down and back up;
+    - no visible change at all for `window` consecutive actions.
+
+    Screenshots within `hash_threshold` bits are considered identical, so that a
+    blinking cursor or a rotating ad does not count as progress.
+    """
+
+    def __init__(self, window: int = 6, max_repeats: int = 3, hash_threshold: int = 4):
+        self.window = window
+        self.max_repeats = max_repeats
+        self.hash_threshold = hash_threshold
+        self._steps: Deque[_Step] = deque(maxlen=window)
+        self._state: Tuple[int, str] | None = None
+
+    def start(self, screen_hash: int, url: str) -> None:
+        """Set the page state before the first action."""
+        self._state = (screen_hash, url)
+
+    def reset(self) -> None:
+        """Forget the recorded steps, e.g. after a recovery hint was given."""
+        self._steps.clear()
+
+    def _same_state(self, a: Tuple[int, str], b: Tuple[int, str]) -> bool:
+        return a[1] == b[1] and hamming(a[0], b[0]) <= self.hash_threshold
+
+    def record(
+        self, arguments: Dict[str, Any], screen_hash: int, url: str
+    ) -> str | None:
+        """Record an executed action and the page state after it.
+
+        Returns:
+            A description of the detected pattern, or None if the trajectory progresses.
+        """
+        before, self._state = self._state, (screen_hash, url)
+        if before is None or arguments.get("action") in PASSIVE_ACTIONS:
+            return None
+        key = action_key(arguments)
+        changed = not self._same_state(before, self._state)
+        self._steps.append(_Step(before[0], before[1], key, changed))
+
+        repeats = sum(
+            1
+            for step in self._steps
+            if step.action == key
+            and self._same_state((step.screen_hash, step.url), before)
+        )
+        if repeats >= self.max_repeats:
+            return f"action {key} was taken {repeats} times from the same page state"
+        if len(self._steps) == self.window and not any(s.changed for s in self._steps):
+            return f"the page did not change during the last {self.window} actions"
+        return None
@@ -45,6 +45,12 @@ async def run_fara_agent(
     save_screenshots: bool = True,
     max_rounds: int = 100,
     use_browser_base: bool = False,
+    align_viewport_to_model_grid: bool = False,
+    popup_grace_period: float = 0.25,
+    request_interception: str | None = None,
+    record_har_path: str | None = None,
+    replay_har_path: str | None = None,
+    http_cache_dir: str | None = None,
 ):
     # Initialize browser manager
     print("Initializing Browser...")
@@ -60,6 +66,12 @@ async def run_fara_agent(
         single_tab_mode=True,
         animate_actions=False,
         use_browser_base=use_browser_base,
+        align_viewport_to_model_grid=align_viewport_to_model_grid,
+        popup_grace_period=popup_grace_period,
+        request_interception=request_interception,
+        record_har_path=record_har_path,
+        replay_har_path=replay_har_path,
+        http_cache=http_cache_dir,
         logger=logger,
     )
     print("Browser Running... Starting Fara Agent...")
@@ -153,6 +165,42 @@ def main():
         action="store_true",
         help="Whether to use BrowserBase for browser management",
     )
+    parser.add_argument(
+        "--align_viewport",
+        action="store_true",
+        help="Size the viewport so screenshots match the model input size and need no resizing",
+    )
+    parser.add_argument(
+        "--popup_grace_period",
+        type=float,
+        default=0.25,
+        help="Seconds a click waits for a popup it may have opened (0 to not wait)",
+    )
+    parser.add_argument(
+        "--request_interception",
+        type=str,
+        choices=["ads", "lean"],
+        default=None,
+        help="Block ad and tracker requests ('ads'), plus fonts and media over 2 MB ('lean')",
+    )
+    parser.add_argument(
+        "--record_har",
+        type=str,
+        default=None,
+        help="Record the network traffic of the session to this HAR file (.har or .zip)",
+    )
+    parser.add_argument(
+        "--replay_har",
+        type=str,
+        default=None,
+        help="Serve all requests from this recorded HAR file, aborting the others",
+    )
+    parser.add_argument(
+        "--http_cache_dir",
+        type=str,
+        default=None,
+        help="Cache static assets in this directory, shared across sessions",
+    )
     parser.add_argument(
         "--endpoint_config",
         type=Path,
@@ -215,6 +263,12 @@ def main():
             save_screenshots=args.save_screenshots,
             max_rounds=args.max_rounds,
             use_browser_base=args.browserbase,
+            align_viewport_to_model_grid=args.align_viewport,
+            popup_grace_period=args.popup_grace_period,
+            request_interception=args.request_interception,
+            record_har_path=args.record_har,
+            replay_har_path=args.replay_har,
+            http_cache_dir=args.http_cache_dir,
         )
     )
 
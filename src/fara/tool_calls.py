@@ -0,0 +1,142 @@
+import copy
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import best_match
+
+from ._prompts import FaraComputerUse
+
+TOOL_CALL_START = "<tool_call>"
+TOOL_CALL_END = "</tool_call>"
+
+# JSON values as produced by json.dumps, kept simple enough for a guided-decoding FSM
+_JSON_STRING = r'"(?:[^"\\\n]|\\.)*"'
+_JSON_NUMBER = r"-?\d+(?:\.\d+)?"
+_JSON_BOOLEAN = r"(?:true|false)"
+_JSON_FLAT_ARRAY = r"\[[^\[\]\n]*\]"
+
+
+class ToolCallParseError(ValueError):
+    """The model response does not contain a valid computer_use tool call."""
+
+
+def _function_parameters(include_input_text_key_args: bool) -> Dict[str, Any]:
+    parameters = copy.deepcopy(FaraComputerUse.parameters)
+    if not include_input_text_key_args:
+        parameters["properties"].pop("press_enter", None)
+        parameters["properties"].pop("delete_existing_text", None)
+    return parameters
+
+
+@lru_cache(maxsize=2)
+def tool_call_schema(include_input_text_key_args: bool = True) -> Dict[str, Any]:
+    """JSON schema of the object inside a <tool_call> block."""
+    return {
+        "type": "object",
+        "properties": {
+            "name": {"const": FaraComputerUse.name},
+            "arguments": _function_parameters(include_input_text_key_args),
+        },
+        "required": ["name", "arguments"],
+    }
+
+
+def _value_regex(prop: Dict[str, Any]) -> str:
+    if "enum" in prop:
+        return "(?:" + "|".join(re.escape(json.dumps(v)) for v in prop["enum"]) + ")"
+    return {
+        "string": _JSON_STRING,
+        "number": _JSON_NUMBER,
+        "boolean": _JSON_BOOLEAN,
+        "array": _JSON_FLAT_ARRAY,
+    }[prop["type"]]
+
+
+def _not_containing(word: str) -> str:
+    """Regex of any text that does not contain `word`, without lookarounds, which
+    guided-decoding FSMs do not support. `word` must not repeat its first character.
+    """
+    first, rest = word[0], word[1:]
+    assert first not in rest, f"{word!r} repeats its first character"
+    # after `first`, a proper prefix of `rest` may be followed by `first` again (a new
+    # attempt), by a character that breaks the match, or by the end of the text
+    prefixes = "|".join(re.escape(rest[:k]) for k in range(len(rest)))
+    breaks = "|".join(
+        re.escape(rest[:k]) + f"[^{re.escape(first + rest[k])}]"
+        for k in range(len(rest))
+    )
+    start = re.escape(first) + f"(?:(?:{prefixes}){re.escape(first)})*"
+    return f"(?:[^{re.escape(first)}]|{start}(?:{breaks}))*(?:{start}(?:{prefixes}))?"
+
+
+@lru_cache(maxsize=8)
+def tool_call_regex(
+    include_input_text_key_args: bool = True, max_calls: int = 1
+) -> str:
+    """Regex of a full response, free-form thoughts followed by one to `max_calls`
+    tool calls, for guided decoding (vLLM `guided_regex`). The thoughts may contain
+    "<" but not a tool call. `action` is always the first argument.
+    """
+    properties = _function_parameters(include_input_text_key_args)["properties"]
+    others = "|".join(
+        f"{re.escape(json.dumps(name))}: {_value_regex(prop)}"
+        for name, prop in properties.items()
+        if name != "action"
+    )
+    arguments = (
+        r'\{"action": '
+        + _value_regex(properties["action"])
+        + f"(?:, (?:{others}))*"
+        + r"\}"
+    )
+    tool_call = (
+        re.escape(
+            f'{TOOL_CALL_START}\n{{"name": "{FaraComputerUse.name}", "arguments": '
+        )
+        + arguments
+        + re.escape(f"}}\n{TOOL_CALL_END}")
+    )
+    if max_calls > 1:
+        tool_call += f"(?:\n{tool_call}){{0,{max_calls - 1}}}"
+    return _not_containing(TOOL_CALL_START) + tool_call
+
+
+def truncate_tool_calls(message: str, max_calls: int) -> str:
+    """Cut a response after its `max_calls`-th tool call, if it has more."""
+    end = -1
+    for _ in range(max_calls):
+        end = message.find(TOOL_CALL_END, end + 1)
+        if end < 0:
+            return message
+    return message[: end + len(TOOL_CALL_END)]
+
+
+class ToolCallParser:
+    """Parse a response into thoughts and a tool call validated against the schema.
+
+    The validator is compiled once per parser and reused for every response.
+    """
+
+    def __init__(self, include_input_text_key_args: bool = True):
+        schema = tool_call_schema(include_input_text_key_args)
+        Draft202012Validator.check_schema(schema)
+        self._validator = Draft202012Validator(schema)
+
+    def parse(self, message: str) -> Tuple[str, Dict[str, Any]]:
+        start = message.find(TOOL_CALL_START)
+        end = message.find(TOOL_CALL_END, start)
+        if start < 0 or end < 0:
+            raise ToolCallParseError(f"No complete {TOOL_CALL_START} block")
+        thoughts = message[:start].strip()
+        action_text = message[start + len(TOOL_CALL_START) : end].strip()
+        try:
+            action = json.loads(action_text)
+        except json.JSONDecodeError as e:
+            raise ToolCallParseError(f"Invalid action text: {action_text}") from e
+        error = best_match(self._validator.iter_errors(action))
+        if error is not None:
+            raise ToolCallParseError(f"Invalid tool call: {error.message}")
+        return thoughts, action
@@ -1,3 +1,6 @@
+import asyncio
+
+
 def strip_url_query(url):
     return url.split("?", 1)[0]
 
@@ -7,3 +10,44 @@ def get_trimmed_url(url, max_len):
     if len(trimmed_url) > max_len:
         trimmed_url = trimmed_url[:max_len] + " ..."
     return trimmed_url
+
+
+class LoopLagMonitor:
+    """Measures event loop lag: how late a periodic `asyncio.sleep(interval)` wakes up."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+    @property
+    def mean_lag(self) -> float:
+        return self.total_lag / self.samples if self.samples else 0.0
+
+    def summary(self) -> str:
+        return f"loop lag over {self.samples} samples: mean {self.mean_lag * 1000:.1f}ms, max {self.max_lag * 1000:.1f}ms"
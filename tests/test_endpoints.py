@@ -0,0 +1,60 @@
+import asyncio
+
+from fara.endpoints import EndpointPool, is_vllm
+
+SLOW, FAST = "http://slow/v1", "http://fast/v1"
+DELAYS = {SLOW: 0.5, FAST: 0.01}
+
+
+def _pool() -> EndpointPool:
+    return EndpointPool(
+        [{"base_url": SLOW, "api_key": "x"}, {"base_url": FAST, "api_key": "x"}],
+        initial_hedge_delay=0.05,
+    )
+
+
+def test_slow_endpoint_that_loses_its_hedges_stops_being_primary():
+    pool = _pool()
+    primaries = []
+
+    async def main():
+        for _ in range(20):
+            calls = []
+
+            async def fn(endpoint):
+                calls.append(endpoint.base_url)
+                await asyncio.sleep(DELAYS[endpoint.base_url])
+                return endpoint.base_url
+
+            assert await pool.request(fn) == FAST
+            primaries.append(calls[0])
+
+    asyncio.run(main())
+    slow, fast = pool.endpoints
+    # picked once before it has a sample, then ranked by its lost attempt
+    assert primaries.count(SLOW) <= 1
+    assert slow.wins == 0 and fast.wins == 20
+    assert slow.mean_latency >= pool.initial_hedge_delay > fast.mean_latency
+
+
+def test_cancelled_attempt_records_a_lower_bound():
+    pool = _pool()
+    slow = pool.endpoints[0]
+
+    async def main():
+        task = asyncio.create_task(pool._attempt(slow, lambda e: asyncio.sleep(1)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert len(slow.latencies) == 1 and slow.latencies[0] >= 0.05
+    assert slow.in_flight == 0 and slow.failures == 0
+
+
+def test_is_vllm():
+    assert is_vllm({"base_url": "http://localhost:5000/v1"})
+    assert not is_vllm({"base_url": "https://api.openai.com/v1"})
+    assert not is_vllm({"base_url": "https://x.openai.azure.com/"})
+    assert not is_vllm({"base_url": "http://localhost:5000/v1", "vllm": False})
+    assert is_vllm({"base_url": "https://x.inference.ml.azure.com/", "vllm": True})
@@ -0,0 +1,12 @@
+from fara.browser.http_cache import _freshness_lifetime
+
+
+def test_freshness_lifetime():
+    assert _freshness_lifetime({"cache-control": "public, max-age=3600"}) == 3600.0
+    assert _freshness_lifetime({"cache-control": "no-cache"}) == 0.0
+    assert _freshness_lifetime({}) == 0.0
+
+
+def test_no_store_and_private_responses_are_not_stored():
+    assert _freshness_lifetime({"cache-control": "no-store"}) is None
+    assert _freshness_lifetime({"cache-control": "private, max-age=600"}) is None
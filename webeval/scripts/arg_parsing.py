@@ -38,6 +38,30 @@ def _get_base_eval_arg_parser():
         "enable_guidelines_prompt": bool,
         "include_url": bool,
         "max_url_chars": int,
+        "screenshot_format": str,
+        "screenshot_quality": int,
+        "settle_policy": str,
+        "align_viewport_to_model_grid": bool,
+        "popup_grace_period": float,
+        "request_interception": str,
+        "history_mode": str,
+        "image_evict_block": int,
+        "stream_responses": bool,
+        "guided_decoding": bool,
+        "max_actions_per_turn": int,
+        "no_progress_policy": str,
+        "no_progress_window": int,
+        "max_seconds": float,
+        "max_prompt_tokens": int,
+        "max_completion_tokens": int,
+        "hedge_requests": bool,
+        "hedge_percentile": float,
+        "browser_pool_size": int,
+        "prewarm_depth": int,
+        "har_mode": str,
+        "har_dir": str,
+        "http_cache_dir": str,
+        "http_cache_max_mb": int,
     }
 
     parser = argparse.ArgumentParser(description="Evaluate WebSurfer system")
@@ -2,6 +2,8 @@ import math
 import os
 import json
 import asyncio
+import atexit
+import dataclasses
 import logging
 import random
 from typing import Dict, Any, List, Tuple, Union, Optional, Optional
@@ -21,10 +23,25 @@ from urllib.parse import urlparse
 import asyncio
 import argparse
 from fara import FaraAgent
+from fara.endpoints import EndpointPool
 from fara.browser.browser_bb import BrowserBB
+from fara.browser.browser_pool import BrowserPool, WarmContextQueue
+from fara.browser.http_cache import HttpCache
+from fara._prompts import aligned_viewport_size
 import logging
 
 
+def _stats_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Difference of two snapshots of cumulative stats, rounding float fields."""
+    delta = {}
+    for key, value in after.items():
+        if isinstance(value, float):
+            delta[key] = round(value - before[key], 3)
+        elif isinstance(value, int):
+            delta[key] = value - before[key]
+    return delta
+
+
 @default_subscription
 class WebSurferSystemOrchestrator(BaseOrchestrator):
     """WebSurferSystemOrchestrator"""
@@ -55,8 +72,44 @@ class WebSurferSystem(BaseSystem):
     """
         WebSurferSystem that communicates with either a local or hosted WebSurfer model to perform web-based tasks.
         If websurfer_client_cfg is not provided, it defaults to a local vllm server on localhost:5000 which ought to have already been started.
-        Otherwise, it can accept a config dict, a list of config dicts (randomly choosing one per run), or a path to a config file to a foundry endpoint.
+        Otherwise, it can accept a config dict, a list of config dicts (randomly choosing one per run, or all of them
+        with hedged requests if web_surfer_kwargs has hedge_requests), or a path to a config file to a foundry endpoint.
+        Hedged requests go through one EndpointPool per worker process, shared by its tasks on a persistent event loop,
+        so that endpoint latencies learned by a task carry over to the next ones.
+        Keys of web_surfer_kwargs listed in FARA_AGENT_KWARGS are forwarded to FaraAgent, those in BROWSER_KWARGS to BrowserBB.
+        With browser_pool_size in web_surfer_kwargs, tasks of a worker process share one event loop and a warm browser in a
+        BrowserPool, and each task only creates a fresh browser context. Tasks of a worker run one at a time, so sizes above
+        1 are reduced to 1; parallelism comes from worker processes. The browser_pool metrics of a task are the pool stats
+        accumulated during that task. prewarm_depth additionally keeps that many
+        contexts prepared in the background (on the start page unless start_on_target_url), with their own browsers.
+        har_mode "record" saves the network traffic of each task to <har_dir or the task output dir>/<question_id>.har.zip,
+        and "replay" serves each task from <har_dir>/<question_id>.har.zip (or <har_dir>/<question_id>/<question_id>.har.zip,
+        i.e. har_dir can be the output dir of a recording run) without network.
+        http_cache_dir enables a disk cache of static assets shared by all tasks and worker processes (bounded by
+        http_cache_max_mb, 1024 by default).
     """
+    FARA_AGENT_KWARGS = {
+        "max_n_images",
+        "screenshot_format",
+        "screenshot_quality",
+        "settle_policy",
+        "history_mode",
+        "image_evict_block",
+        "stream_responses",
+        "guided_decoding",
+        "max_actions_per_turn",
+        "no_progress_policy",
+        "no_progress_window",
+        "max_seconds",
+        "max_prompt_tokens",
+        "max_completion_tokens",
+        "hedge_percentile",
+    }
+    BROWSER_KWARGS = {
+        "align_viewport_to_model_grid",
+        "popup_grace_period",
+        "request_interception",
+    }
     def __init__(
         self,
         system_name: str,
@@ -87,6 +140,13 @@ class WebSurferSystem(BaseSystem):
         ### add a bool to save env_state
         self.save_env_state=save_env_state
 
+        # created on the first task of a worker process when browser_pool_size or hedge_requests is set
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._endpoint_pool: Optional[EndpointPool] = None
+        self._browser_pool: Optional[BrowserPool] = None
+        self._warm_contexts: Optional[WarmContextQueue] = None
+        self._http_cache: Optional[HttpCache] = None
+
         if not step_budgets:
             self.step_budgets = [
                 math.ceil(self.max_rounds * pct) for pct in [0.05, 0.1, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 1.0]
@@ -162,13 +222,37 @@ class WebSurferSystem(BaseSystem):
                     with open(self.websurfer_client_cfg, "r") as f:
                         client_config = json.load(f)
                 elif isinstance(self.websurfer_client_cfg, list):
-                    # use a random config from the list
-                    client_config = random.choice(self.websurfer_client_cfg)
+                    if self.web_surfer_kwargs.get("hedge_requests"):
+                        # route over all endpoints and hedge slow requests, with the pool of this worker process
+                        client_config = self.websurfer_client_cfg
+                        if self._endpoint_pool is None:
+                            self._endpoint_pool = EndpointPool(
+                                client_config,
+                                hedge_percentile=self.web_surfer_kwargs.get("hedge_percentile", 0.95),
+                            )
+                    else:
+                        # use a random config from the list
+                        client_config = random.choice(self.websurfer_client_cfg)
                 elif isinstance(self.websurfer_client_cfg, dict):
                     client_config = self.websurfer_client_cfg
                 else:
                     raise ValueError("Invalid websurfer_client_cfg type, must be a valid config with model, base_url, api_key fields")
 
+            fara_kwargs = {k: v for k, v in self.web_surfer_kwargs.items() if k in self.FARA_AGENT_KWARGS}
+            browser_kwargs = {k: v for k, v in self.web_surfer_kwargs.items() if k in self.BROWSER_KWARGS}
+            browser_kwargs.update(self._har_kwargs(question_id, output_dir))
+            if self.web_surfer_kwargs.get("http_cache_dir"):
+                if self._http_cache is None:
+                    self._http_cache = HttpCache(
+                        self.web_surfer_kwargs["http_cache_dir"],
+                        max_bytes=self.web_surfer_kwargs.get("http_cache_max_mb", 1024) * 1024 * 1024,
+                    )
+                browser_kwargs["http_cache"] = self._http_cache
+
+            # the pool stats are per process, the task's metrics report what changed during the task
+            pool_stats_before = dataclasses.asdict(self._browser_pool.stats) if self._browser_pool is not None else None
+            warm_stats_before = dataclasses.asdict(self._warm_contexts.stats) if self._warm_contexts is not None else None
+
             # Create the FaraAgent instance
             for _ in range(1):
                 # Initialize browser manager
@@ -184,7 +268,10 @@ class WebSurferSystem(BaseSystem):
                     single_tab_mode=True,
                     animate_actions=False,
                     use_browser_base=self.use_browserbase,
-                    logger=logger
+                    browser_pool=self._browser_pool,
+                    warm_contexts=self._warm_contexts,
+                    logger=logger,
+                    **browser_kwargs
                 )
 
                 agent = FaraAgent(
@@ -193,19 +280,51 @@ class WebSurferSystem(BaseSystem):
                     start_page=start_page,
                     downloads_folder=output_dir,
                     save_screenshots=True,
-                    max_rounds=100,
-                    logger = logger
+                    max_rounds=self.max_rounds,
+                    endpoint_pool=self._endpoint_pool,
+                    logger = logger,
+                    **fara_kwargs
                 )
 
-                await agent.initialize()
-                logging.info(f"Initialized FaraAgent with start page: {start_page}")
-                print(f"Running task: {question_text}")
-                print("----------------------------------------")
-                final_answer, all_actions, all_observations = await agent.run(question_text)
+                try:
+                    await agent.initialize()
+                    logging.info(f"Initialized FaraAgent with start page: {start_page}")
+                    print(f"Running task: {question_text}")
+                    print("----------------------------------------")
+                    final_answer, all_actions, all_observations = await agent.run(question_text)
+                finally:
+                    # Close the agent and browser (a pooled browser goes back to the pool)
+                    await agent.close()
                 final_answer_store.final_answer = final_answer
+                final_answer_store.abort_reason = agent.abort_reason
+                final_answer_store.set_token_usage(
+                    "fara",
+                    {
+                        "prompt_tokens": agent.usage_stats.prompt_tokens,
+                        "completion_tokens": agent.usage_stats.completion_tokens,
+                    },
+                )
+                final_answer_store.metrics = agent.metrics()
+                if self._browser_pool is not None:
+                    final_answer_store.metrics["browser_pool"] = _stats_delta(
+                        pool_stats_before, dataclasses.asdict(self._browser_pool.stats)
+                    )
+                if browser_manager.http_cache_stats is not None:
+                    final_answer_store.metrics["http_cache"] = {
+                        **dataclasses.asdict(browser_manager.http_cache_stats),
+                        "hit_ratio": round(browser_manager.http_cache_stats.hit_ratio, 3),
+                    }
+                if browser_manager.interception_stats is not None:
+                    interception_stats = browser_manager.interception_stats
+                    final_answer_store.metrics["request_interception"] = {
+                        **dataclasses.asdict(interception_stats),
+                        "blocked_bytes": interception_stats.blocked_bytes,
+                    }
+                if self._warm_contexts is not None:
+                    final_answer_store.metrics["warm_contexts"] = _stats_delta(
+                        warm_stats_before, dataclasses.asdict(self._warm_contexts.stats)
+                    )
                 break  # Exit the retry loop if successful
-                # Close the agent and browser
-                await agent.close()
 
 
             # look at the output dir for any file that looks like screenshot{i}.png where i is an integer and nothing else
@@ -227,10 +346,85 @@ class WebSurferSystem(BaseSystem):
         handler = LogHandler(filename=log_file)
         try:
             logger.addHandler(handler)
-            return asyncio.run(_runner())
+            return self._run_async(_runner())
         finally:
             logger.removeHandler(handler)
             handler.close()
+
+    def _har_kwargs(self, question_id: str, output_dir: str) -> Dict[str, str]:
+        har_mode = self.web_surfer_kwargs.get("har_mode")
+        if not har_mode:
+            return {}
+        har_dir = self.web_surfer_kwargs.get("har_dir")
+        if har_mode == "record":
+            return {"record_har_path": os.path.join(har_dir or output_dir, f"{question_id}.har.zip")}
+        elif har_mode == "replay":
+            assert har_dir, "har_dir must be set to replay recorded tasks"
+            har_path = os.path.join(har_dir, f"{question_id}.har.zip")
+            if not os.path.exists(har_path):
+                har_path = os.path.join(har_dir, str(question_id), f"{question_id}.har.zip")
+            return {"replay_har_path": har_path}
+        raise ValueError(f"Unknown har_mode: {har_mode}. Available options: ['record', 'replay']")
+
+    def _run_async(self, coro):
+        """Run a task. With a browser pool or hedged requests, all tasks run on one event loop that keeps the pools
+        alive (the endpoint clients are bound to the loop of their first request)."""
+        pool_size = self.web_surfer_kwargs.get("browser_pool_size")
+        if pool_size and pool_size > 1:
+            # tasks of a worker process run one after the other, a single task never leases a second browser
+            if self._browser_pool is None:
+                logging.warning(
+                    f"browser_pool_size={pool_size} has no effect, each worker process runs one task at a time; "
+                    "using 1 (add worker processes to run tasks in parallel)"
+                )
+            pool_size = 1
+        if not pool_size and not self.web_surfer_kwargs.get("hedge_requests"):
+            return asyncio.run(coro)
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            atexit.register(self.close)
+        if pool_size and self._browser_pool is None:
+            prewarm_depth = self.web_surfer_kwargs.get("prewarm_depth") or 0
+            self._browser_pool = BrowserPool(size=pool_size + prewarm_depth, browser_channel="firefox", headless=True)
+            if prewarm_depth:
+                viewport_width, viewport_height = 1440, 900
+                if self.web_surfer_kwargs.get("align_viewport_to_model_grid"):
+                    viewport_width, viewport_height = aligned_viewport_size(viewport_width, viewport_height)
+                self._warm_contexts = WarmContextQueue(
+                    self._browser_pool,
+                    viewport_width=viewport_width,
+                    viewport_height=viewport_height,
+                    depth=prewarm_depth,
+                    start_page=None if self.start_on_target_url else "https://www.bing.com",
+                    request_interception=self.web_surfer_kwargs.get("request_interception"),
+                )
+        return self._loop.run_until_complete(coro)
+
+    def close(self) -> None:
+        """Close the browser pool, the endpoint clients and their event loop, if any."""
+        if self._loop is None:
+            return
+        if self._warm_contexts is not None:
+            self._loop.run_until_complete(self._warm_contexts.close())
+        if self._browser_pool is not None:
+            self._loop.run_until_complete(self._browser_pool.close())
+        if self._endpoint_pool is not None:
+            self._loop.run_until_complete(self._endpoint_pool.close())
+        self._loop.close()
+        self._loop = None
+        self._endpoint_pool = None
+        self._browser_pool = None
+        self._warm_contexts = None
+
+    def __getstate__(self):
+        # the event loop and the browsers belong to the worker process that created them
+        state = self.__dict__.copy()
+        state["_loop"] = None
+        state["_endpoint_pool"] = None
+        state["_browser_pool"] = None
+        state["_warm_contexts"] = None
+        state["_http_cache"] = None
+        return state
         
             
     def load_answer_from_disk(self, task_id: str, output_dir: str) -> Any:
@@ -239,7 +433,7 @@ class WebSurferSystem(BaseSystem):
     
     def hash(self) -> str:
         surfer_args = {
-            k: v for k, v in self.web_surfer_kwargs.items() if k in {'max_n_images'}}    # TODO: cleanup
+            k: v for k, v in self.web_surfer_kwargs.items() if k in self.FARA_AGENT_KWARGS | self.BROWSER_KWARGS}    # TODO: cleanup
         if (self.web_surfer_kwargs is not None) and any(self.web_surfer_kwargs.values()):
             return f'{super().hash()}-{self.web_surfer_model_type}-{self.max_rounds}-{dict_2_str(surfer_args)}'   # TODO: incorporate other hyperparameters?
         return f'{super().hash()}-{self.web_surfer_model_type}-{self.max_rounds}--{self.save_env_state}'
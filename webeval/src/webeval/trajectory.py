@@ -1,7 +1,7 @@
 from pathlib import Path
 import json
 from dataclasses import dataclass, asdict, field
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
 from collections import defaultdict
 from autogen_core.components.models import RequestUsage
@@ -21,6 +21,11 @@ class FinalAnswer:
 
     screenshots: List[str] = field(default_factory=list)
     is_aborted: bool = False
+    # why the agent stopped before answering (budget, no progress); unlike is_aborted
+    # the answer is still evaluated and the task is not re-executed
+    abort_reason: Optional[str] = None
+    # per-task agent metrics, e.g. model_calls, cached_tokens, model_seconds, wall_seconds
+    metrics: Dict[str, float] = field(default_factory=dict)
     is_rel_paths: bool = True   # True as default, but missing value is interpreted
     token_usage: Dict[str, Dict[str, int]] = field(default_factory=dict)
 